@@ -0,0 +1,539 @@
+"""디스코드 연결 없이 티켓봇의 주요 경로를 측정하는 벤치마크입니다.
+
+가짜 서버(Guild, CategoryChannel, TextChannel, Member, Interaction)에 REST 지연과
+속도 제한을 흉내 내고, 티켓 생성 / 통계 / 티켓 닫기 / 설정 저장 경로를 실행합니다.
+
+사용 예:
+    python bench.py --tickets 2000 --concurrency 200 --json bench-results.json
+    python bench.py --compare bench-results.json
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+import discord
+
+import main
+
+# 디스코드 기준 시각 (2015-01-01, 밀리초)
+DISCORD_EPOCH = 1420070400000
+
+_snowflake_counter = itertools.count()
+
+def snowflake() -> int:
+    """현재 시각 기반의 가짜 스노우플레이크 ID를 생성합니다."""
+    return ((int(time.time() * 1000) - DISCORD_EPOCH) << 22) | (next(_snowflake_counter) & 0x3FFFFF)
+
+# 가짜 REST 계층
+class FakeREST:
+    """REST 호출 수를 세고 지연 시간과 경로별 속도 제한을 흉내 냅니다."""
+    def __init__(self, latency: float, jitter: float, limits: Dict[str, Tuple[int, float]]):
+        self.latency = latency
+        self.jitter = jitter
+        self.limits = limits
+        self.calls: collections.Counter = collections.Counter()
+        self.ratelimit_waits = 0
+        self.windows: Dict[str, collections.deque] = {}
+
+    async def call(self, route: str):
+        self.calls[route] += 1
+        limit = self.limits.get(route)
+        if limit:
+            count, per = limit
+            window = self.windows.setdefault(route, collections.deque())
+            while True:
+                now = time.monotonic()
+                while window and now - window[0] >= per:
+                    window.popleft()
+                if len(window) < count:
+                    window.append(now)
+                    break
+                self.ratelimit_waits += 1
+                await asyncio.sleep(per - (now - window[0]))
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+# 가짜 디스코드 객체
+class FakeRole:
+    def __init__(self, guild: "FakeGuild", role_id: int, name: str):
+        self.guild = guild
+        self.id = role_id
+        self.name = name
+        self.mention = f"<@&{role_id}>"
+
+class FakeMember:
+    def __init__(self, guild: "FakeGuild", member_id: int, name: str):
+        self.guild = guild
+        self.id = member_id
+        self.name = name
+        self.mention = f"<@{member_id}>"
+        self.roles: List[FakeRole] = []
+
+class FakeMessage:
+    def __init__(self, author: FakeMember, content: str, created_at: datetime.datetime):
+        self.id = snowflake()
+        self.author = author
+        self.content = content
+        self.created_at = created_at
+        self.embeds = []
+        self.attachments = []
+
+class FakeTextChannel(discord.TextChannel):
+    """discord.TextChannel을 상속해 isinstance 검사를 통과하는 가짜 채널입니다."""
+    def __init__(self, guild: "FakeGuild", name: str, category_id: Optional[int] = None, topic: Optional[str] = None):
+        self.guild = guild
+        self.id = snowflake()
+        self.name = name
+        self.category_id = category_id
+        self.topic = topic
+        self.messages: List[FakeMessage] = []
+
+    async def send(self, content=None, *, embed=None, embeds=None, file=None, files=None, view=None, **kwargs):
+        await self.guild.rest.call("message_send")
+        for attached in ([file] if file else []) + list(files or []):
+            attached.close()
+        message = FakeMessage(self.guild.me, content or "", datetime.datetime.now(datetime.timezone.utc))
+        self.messages.append(message)
+        return message
+
+    async def history(self, limit=None, oldest_first=False, **kwargs):
+        # 실제 API처럼 100개씩 페이지 단위로 가져옴
+        messages = self.messages if oldest_first else list(reversed(self.messages))
+        if limit is not None:
+            messages = messages[:limit]
+        for start in range(0, len(messages), 100):
+            await self.guild.rest.call("history")
+            for message in messages[start:start + 100]:
+                yield message
+
+    async def edit(self, *, name=None, topic=None, overwrites=None, **kwargs):
+        await self.guild.rest.call("channel_edit")
+        if name is not None:
+            self.name = name
+        if topic is not None:
+            self.topic = topic
+        await self.guild.bot.on_guild_channel_update(self, self)
+        return self
+
+    async def set_permissions(self, target, **kwargs):
+        await self.guild.rest.call("permissions")
+
+    async def delete(self, **kwargs):
+        await self.guild.rest.call("channel_delete")
+        self.guild.channels.pop(self.id, None)
+        category = self.guild.channels.get(self.category_id)
+        if category is not None:
+            category.channels.remove(self)
+        await self.guild.bot.on_guild_channel_delete(self)
+
+class FakeCategory:
+    def __init__(self, guild: "FakeGuild", name: str):
+        self.guild = guild
+        self.id = snowflake()
+        self.name = name
+        self.overwrites = {}
+        self.channels: List[FakeTextChannel] = []
+
+    async def delete(self, **kwargs):
+        await self.guild.rest.call("category_delete")
+        self.guild.channels.pop(self.id, None)
+        self.guild.categories.remove(self)
+
+    async def create_text_channel(self, name: str, *, overwrites=None, topic=None, **kwargs) -> FakeTextChannel:
+        await self.guild.rest.call("channel_create")
+        channel = FakeTextChannel(self.guild, name.lower(), self.id, topic)
+        self.channels.append(channel)
+        self.guild.channels[channel.id] = channel
+        await self.guild.bot.on_guild_channel_create(channel)
+        return channel
+
+class FakeGuild:
+    def __init__(self, bot: main.TicketBot, rest: FakeREST, members: int, support_roles: int = 2):
+        self.bot = bot
+        self.rest = rest
+        self.id = snowflake()
+        self.name = "bench"
+        self.filesize_limit = 10 * 1024 * 1024
+        self.default_role = FakeRole(self, self.id, "@everyone")
+        self.roles = {role.id: role for role in (FakeRole(self, snowflake(), f"support-{i}") for i in range(support_roles))}
+        self.owner = FakeMember(self, snowflake(), "owner")
+        self.owner_id = self.owner.id
+        self.me = FakeMember(self, snowflake(), "ticket-bot")
+        self.members = {member.id: member for member in (FakeMember(self, snowflake(), f"user{i}") for i in range(members))}
+        self.category = FakeCategory(self, "tickets")
+        self.categories = [self.category]
+        self.log_channel = FakeTextChannel(self, "ticket-log")
+        self.channels = {self.category.id: self.category, self.log_channel.id: self.log_channel}
+
+    async def create_category(self, name: str, *, overwrites=None, **kwargs) -> FakeCategory:
+        await self.rest.call("category_create")
+        category = FakeCategory(self, name)
+        self.categories.append(category)
+        self.channels[category.id] = category
+        return category
+
+    def ticket_channels(self) -> List[FakeTextChannel]:
+        """모든 티켓 카테고리(넘침 카테고리 포함)의 채널입니다."""
+        return [channel for category in self.categories for channel in category.channels]
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_channel_or_thread(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_role(self, role_id):
+        return self.roles.get(role_id)
+
+    def get_member(self, member_id):
+        return self.members.get(member_id)
+
+    def get_member_named(self, name):
+        return next((member for member in self.members.values() if member.name == name), None)
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self.interaction = interaction
+        self.done = False
+
+    def is_done(self) -> bool:
+        return self.done
+
+    async def _respond(self):
+        if self.done:
+            raise RuntimeError("이미 응답한 상호작용입니다")
+        self.done = True
+        self.interaction.first_response = time.perf_counter()
+        await self.interaction.guild.rest.call("interaction_response")
+
+    async def defer(self, **kwargs):
+        await self._respond()
+
+    async def send_message(self, content=None, **kwargs):
+        await self._respond()
+        self.interaction.replies.append(content)
+
+    async def send_modal(self, modal):
+        await self._respond()
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction"):
+        self.interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        await self.interaction.guild.rest.call("followup")
+        self.interaction.replies.append(content)
+
+class FakeInteraction:
+    def __init__(self, bot: main.TicketBot, guild: FakeGuild, user: FakeMember, channel, custom_id: Optional[str] = None):
+        self.client = bot
+        self.guild = guild
+        self.guild_id = guild.id
+        self.user = user
+        self.channel = channel
+        self.type = discord.InteractionType.component if custom_id else discord.InteractionType.application_command
+        self.data = {"custom_id": custom_id} if custom_id else {}
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.replies: List[Optional[str]] = []
+        self.first_response: Optional[float] = None
+
+# 측정 도구
+class Rejected(Exception):
+    """봇이 요청을 처리하지 않고 거절한 작업입니다. 처리량과 지연 시간에서 빼고 따로 셉니다."""
+
+# 카테고리가 가득 차는 등 티켓을 만들지 못했을 때의 안내 문구 일부
+CREATE_REJECTED_REPLY = "찾을 수 없거나 가득 찼습니다"
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+async def measure(name: str, rest: FakeREST, operations, concurrency: int) -> dict:
+    """작업 목록을 동시 실행 수 제한 안에서 실행하고 처리량, 지연 분위수, REST 호출 수, 최대 메모리를 계산합니다."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    ack_latencies: List[float] = []
+    rejected = 0
+
+    async def run(operation):
+        nonlocal rejected
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                ack = await operation()
+            except Rejected:
+                rejected += 1
+                return
+            end = time.perf_counter()
+            latencies.append(end - start)
+            if ack is not None:
+                ack_latencies.append(ack - start)
+
+    calls_before = rest.total()
+    waits_before = rest.ratelimit_waits
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    await asyncio.gather(*(run(operation) for operation in operations))
+    # 백그라운드 파이프라인까지 끝나야 REST 호출 수가 맞음
+    if main.bot.pipelines:
+        await asyncio.gather(*list(main.bot.pipelines), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    count = len(latencies)
+    return {
+        "ops": count,
+        "rejected": rejected,
+        "seconds": round(elapsed, 4),
+        "throughput": round(count / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "ack_p99_ms": round(percentile(ack_latencies, 0.99) * 1000, 2),
+        "rest_per_op": round((rest.total() - calls_before) / count, 3) if count else 0.0,
+        "ratelimit_waits": rest.ratelimit_waits - waits_before,
+        "peak_mb": round(peak / 1024 / 1024, 2),
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def parse_limits(values: List[str]) -> Dict[str, Tuple[int, float]]:
+    """"route=횟수/초" 형식의 속도 제한을 읽습니다."""
+    limits = {}
+    for value in values:
+        route, _, spec = value.partition("=")
+        count, _, per = spec.partition("/")
+        limits[route] = (int(count), float(per))
+    return limits
+
+# 시나리오
+async def run_benchmarks(args) -> dict:
+    bot = main.bot
+    bot.loop = asyncio.get_running_loop()
+    random.seed(args.seed)
+
+    workdir = tempfile.mkdtemp(prefix="ticket-bench-")
+    os.chdir(workdir)
+    db_path = os.path.join(workdir, "bench.db")
+    bot.settings_store = main.SQLiteSettingsStore(db_path, legacy_json_path=None)
+    bot.ticket_store = main.TicketStore(db_path)
+    bot.transcript_archive = main.TranscriptArchive(db_path) if "archive" in main.TRANSCRIPT_FORMATS else None
+
+    limits = {"channel_create": (args.create_limit, 10.0)}
+    limits.update(parse_limits(args.rate_limit))
+    rest = FakeREST(args.latency, args.jitter, limits)
+    guild = FakeGuild(bot, rest, members=args.tickets)
+    bot.ticket_settings = main.LazySettings(bot.settings_store)
+    bot.ticket_settings[str(guild.id)] = {
+        "category_id": guild.category.id,
+        "support_role_ids": list(guild.roles),
+        "ticket_types": ["구매문의", "기술-지원"],
+        "log_channel_id": guild.log_channel.id,
+        "max_tickets_per_user": 3,
+        # 카테고리당 채널 50개 제한을 넘는 티켓은 넘침 카테고리에 만듦
+        "auto_overflow": True,
+    }
+    members = list(guild.members.values())
+    results = {}
+    tracemalloc.start()
+
+    # 1. 티켓 생성 (일부 사용자는 같은 버튼을 동시에 두 번 클릭)
+    def click(member: FakeMember, ticket_type: str):
+        async def operation():
+            interaction = FakeInteraction(bot, guild, member, None, f"ticket_{ticket_type}")
+            await bot.route_interaction(interaction)
+            if any(reply and CREATE_REJECTED_REPLY in reply for reply in interaction.replies):
+                raise Rejected()
+            return interaction.first_response
+        return operation
+
+    clicks = []
+    for index, member in enumerate(members):
+        ticket_type = "구매문의" if index % 2 else "기술-지원"
+        clicks.append(click(member, ticket_type))
+        if random.random() < args.duplicates:
+            clicks.append(click(member, ticket_type))
+    results["create_ticket"] = await measure("create_ticket", rest, clicks, args.concurrency)
+    results["create_ticket"]["channels"] = len(guild.ticket_channels())
+    results["create_ticket"]["categories"] = len(guild.categories)
+
+    # 티켓마다 대화 기록 채우기
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for channel in guild.ticket_channels():
+        opener = guild.get_member(bot.active_tickets[channel.id].opener_id) if channel.id in bot.active_tickets else guild.me
+        for offset in range(args.messages):
+            channel.messages.append(FakeMessage(opener, f"문의 내용 {offset} 결제 환불 확인 부탁드립니다", now))
+
+    # 2. 통계
+    statistics = getattr(main.statistics, "callback", main.statistics)
+
+    async def stats_operation():
+        interaction = FakeInteraction(bot, guild, guild.owner, guild.log_channel)
+        await statistics(interaction, "30일")
+        return interaction.first_response
+
+    results["statistics"] = await measure("statistics", rest, [stats_operation] * args.stats_calls, args.concurrency)
+
+    # 3. 설정 저장 (여러 서버의 연속 저장을 묶어서 기록)
+    for extra in range(args.guilds):
+        bot.ticket_settings[str(extra + 1)] = dict(bot.ticket_settings[str(guild.id)])
+
+    async def save_operation():
+        for extra in random.sample(range(args.guilds), min(args.guilds, 20)):
+            bot.save_settings(str(extra + 1))
+        return None
+
+    results["save_settings"] = await measure("save_settings", rest, [save_operation] * args.save_calls, args.concurrency)
+    start = time.perf_counter()
+    await bot.flush_settings()
+    results["save_settings"]["flush_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+    # 4. 티켓 닫기
+    def close(channel: FakeTextChannel):
+        async def operation():
+            interaction = FakeInteraction(bot, guild, guild.owner, channel, "close_ticket")
+            await bot.route_interaction(interaction)
+            return interaction.first_response
+        return operation
+
+    results["close_ticket"] = await measure(
+        "close_ticket", rest, [close(channel) for channel in guild.ticket_channels()], args.concurrency
+    )
+
+    # 5. REST 우선순위 (가짜 객체는 http.request를 거치지 않으므로 스케줄러를 직접 사용)
+    scheduler = main.RequestScheduler()
+
+    async def library_request(bucket: str, route: str, retry_after: float = 0.0):
+        # py-cord처럼 429를 받으면 경고 로그(-> block)를 남기고 요청 안에서 기다린 뒤 다시 보냄
+        if retry_after:
+            scheduler.block(bucket, retry_after)
+            await asyncio.sleep(retry_after)
+        await rest.call(route)
+
+    # 처음 REST_CONCURRENCY개의 백그라운드 요청은 429를 받음
+    background = [
+        asyncio.create_task(scheduler.run(
+            f"history:{index}", "background",
+            lambda index=index: library_request(f"history:{index}", "rest_background",
+                                                args.retry_after if index < main.REST_CONCURRENCY else 0.0)
+        ))
+        for index in range(args.background_requests)
+    ]
+    await asyncio.sleep(0)
+
+    def create_request(index: int):
+        async def operation():
+            bucket = f"create:{index}"
+            await scheduler.run(bucket, "create", lambda: library_request(bucket, "rest_create"))
+            return time.perf_counter()
+        return operation
+
+    results["rest_priority"] = await measure(
+        "rest_priority", rest, [create_request(index) for index in range(args.priority_requests)], args.concurrency
+    )
+    await asyncio.gather(*background)
+    wait = main.metrics.histogram("rest_queue_wait_seconds", priority="create")
+    results["rest_priority"]["queue_wait_p95"] = wait.quantile(0.95) if wait is not None else None
+    tracemalloc.stop()
+
+    return {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "params": {key: value for key, value in vars(args).items() if key not in ("json", "compare")},
+        "rest_calls": dict(rest.calls),
+        "scenarios": results,
+    }
+
+# 결과 비교
+COMPARED_FIELDS = {"throughput": -1, "p95_ms": 1, "p99_ms": 1, "rest_per_op": 1, "peak_mb": 1}
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """기준 결과보다 threshold 비율 이상 나빠진 항목을 반환합니다."""
+    regressions = []
+    for scenario, values in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(scenario)
+        if not before:
+            continue
+        for field, direction in COMPARED_FIELDS.items():
+            old, new = before.get(field), values.get(field)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * direction
+            if change > threshold:
+                regressions.append(f"{scenario}.{field}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+def print_report(report: dict):
+    print(f"커밋 {report['commit']} / Python {report['python']}")
+    header = f"{'시나리오':<16}{'ops':>7}{'거절':>6}{'ops/s':>10}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}{'ack99':>9}{'REST/op':>9}{'대기':>6}{'MB':>8}"
+    print(header)
+    for scenario, values in report["scenarios"].items():
+        print(f"{scenario:<16}{values['ops']:>7}{values.get('rejected', 0):>6}{values['throughput']:>10}{values['p50_ms']:>9}{values['p95_ms']:>9}"
+              f"{values['p99_ms']:>9}{values['ack_p99_ms']:>9}{values['rest_per_op']:>9}{values['ratelimit_waits']:>6}{values['peak_mb']:>8}")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="티켓봇 오프라인 벤치마크")
+    parser.add_argument("--tickets", type=int, default=1000, help="티켓을 여는 사용자 수")
+    parser.add_argument("--concurrency", type=int, default=100, help="동시에 처리할 상호작용 수")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="버튼을 두 번 누르는 사용자 비율")
+    parser.add_argument("--messages", type=int, default=200, help="티켓당 대화 메시지 수")
+    parser.add_argument("--stats-calls", type=int, default=200, help="통계 명령어 호출 수")
+    parser.add_argument("--guilds", type=int, default=1000, help="설정 저장 시나리오의 서버 수")
+    parser.add_argument("--save-calls", type=int, default=200, help="설정 저장 호출 수")
+    parser.add_argument("--latency", type=float, default=0.05, help="REST 호출 기본 지연 (초)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="REST 호출 추가 지연 최대값 (초)")
+    parser.add_argument("--create-limit", type=int, default=50, help="10초당 채널 생성 허용 횟수")
+    parser.add_argument("--rate-limit", action="append", default=[], help="경로별 속도 제한 (예: message_send=5/5)")
+    parser.add_argument("--background-requests", type=int, default=200, help="REST 우선순위 시나리오의 백그라운드 요청 수")
+    parser.add_argument("--priority-requests", type=int, default=50, help="REST 우선순위 시나리오의 티켓 생성 요청 수")
+    parser.add_argument("--retry-after", type=float, default=2.0, help="REST 우선순위 시나리오에서 429를 받은 요청의 대기 시간 (초)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="결과를 저장할 JSON 파일")
+    parser.add_argument("--compare", help="비교할 이전 결과 JSON 파일")
+    parser.add_argument("--threshold", type=float, default=0.2, help="회귀로 판단할 악화 비율")
+    args = parser.parse_args()
+
+    # 임시 디렉터리로 이동하기 전에 경로를 절대 경로로 바꿔 둠
+    json_path = os.path.abspath(args.json) if args.json else None
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    report = asyncio.run(run_benchmarks(args))
+    print_report(report)
+
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+
+    if compare_path:
+        with open(compare_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n기준 커밋 {baseline.get('commit')} 대비 회귀:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\n기준 커밋 {baseline.get('commit')} 대비 회귀 없음")
+
+if __name__ == "__main__":
+    main_cli()
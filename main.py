@@ -2,143 +2,3143 @@ import discord
 from discord.ext import commands
 import json
 import datetime
+import logging
 import os
+import re
 import asyncio
-from typing import List, Dict, Optional
+import bisect
+import collections
+import contextlib
+import contextvars
+import gzip
+import hashlib
+import heapq
+import html
+import math
+import time
+import sqlite3
+import string
+import subprocess
+import sys
+import threading
+from typing import Any, Awaitable, Callable, Hashable, List, Dict, Optional, Set, Tuple
+
+# 데이터 파일 경로
+SETTINGS_JSON_PATH = 'ticket_settings.json'
+DATABASE_PATH = 'ticket_bot.db'
+# 설정 저장소 종류 ("sqlite" 또는 "json")
+SETTINGS_BACKEND = "sqlite"
+# 트랜스크립트 저장 설정
+TRANSCRIPT_DIR = 'transcripts'
+TRANSCRIPT_GZIP = False
+# 트랜스크립트 출력 형식 ("text": 텍스트 파일, "html": 웹 브라우저용 파일, "jsonl": 메시지당 JSON 한 줄, "archive": 검색 가능한 보관소)
+TRANSCRIPT_FORMATS = ("text", "html", "jsonl", "archive")
+# 보관소에 트랜스크립트를 보관하는 기간 (일)
+TRANSCRIPT_RETENTION_DAYS = 365
+# 한 번에 디스크에 기록할 메시지 수 (history 페이지 크기와 같음)
+TRANSCRIPT_PAGE_SIZE = 100
+# 백그라운드 작업 단계별 재시도 횟수와 기본 대기 시간 (초)
+PIPELINE_RETRIES = 3
+PIPELINE_RETRY_DELAY = 1.0
+# 디스코드 채널 이름 변경 제한 (채널당 10분에 2회)
+RENAME_LIMIT = 2
+RENAME_WINDOW = 600
+# 통계 저장 주기 (초), 시간별 통계 보관 기간 (일), 처리 시간 분위수 상대 오차
+STATS_FLUSH_INTERVAL = 5.0
+STATS_HOURLY_RETENTION_DAYS = 35
+STATS_SKETCH_ACCURACY = 0.02
+# 지표 HTTP 엔드포인트 (포트가 None이면 끔)
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT: Optional[int] = 9108
+# 이벤트 루프 지연 측정 주기 (초)
+LOOP_LAG_INTERVAL = 0.5
+# 연속된 설정 저장을 묶어서 기록하기 위한 대기 시간 (초)
+SETTINGS_FLUSH_DELAY = 1.0
+# 일괄 종료 동시 작업 수와 진행 상황 보고 주기 (초)
+CLOSE_WORKERS = 4
+CLOSE_PROGRESS_INTERVAL = 3.0
+# 맡은 서버를 잠시 쓸 수 없을 때 종료 작업을 다시 시도하기까지의 시간 (초)
+CLOSE_RETRY_DELAY = 60
+CLOSE_RETRY_LIMIT = 30
+# 속도 제한 구간: 서버별 채널 삭제, 채널별 메시지 전송 (window초에 limit회)
+CHANNEL_DELETE_LIMIT = 5
+CHANNEL_DELETE_WINDOW = 5.0
+MESSAGE_SEND_LIMIT = 5
+MESSAGE_SEND_WINDOW = 5.0
+# 유휴 티켓 확인 주기 (초)
+IDLE_CHECK_INTERVAL = 600
+# 티켓을 닫은 뒤 채널을 삭제하기까지의 시간 (초)
+CLOSE_DELETE_DELAY = 5
+# 이 시간 (초) 안에 만기가 겹치는 예약 작업은 한 번에 처리
+SCHEDULER_BATCH_WINDOW = 0.05
+# 이 프로세스가 맡은 서버를 잠시 쓸 수 없을 때 예약 작업을 다시 시도하기까지의 시간 (초)
+SCHEDULER_RETRY_DELAY = 60
+# 예약 작업의 최대 재시도 횟수와 재시도 대기 시간 상한 (초, SCHEDULER_RETRY_DELAY에서 재시도마다 두 배)
+SCHEDULER_RETRY_LIMIT = 8
+SCHEDULER_MAX_BACKOFF = 3600
+# 로그 묶음 전송: 메시지당 최대 임베드/파일 수 (디스코드 제한), 첫 로그 후 전송까지 최대 대기 시간 (초)
+LOG_DIGEST_SIZE = 10
+LOG_DIGEST_FILES = 10
+LOG_DIGEST_DELAY = 5.0
+# 디스코드 카테고리당 최대 채널 수
+CATEGORY_CHANNEL_LIMIT = 50
+# 스레드 티켓이 자동 보관되기까지의 시간 (분, 디스코드 최대값)
+THREAD_AUTO_ARCHIVE = 10080
+# REST 요청 스케줄러: 동시에 보낼 최대 요청 수, 그중 백그라운드 요청이 쓰지 못하는 자리 수,
+# 봇 토큰 전체의 초당 최대 요청 수 (디스코드 전역 제한 50회보다 낮게, 샤드 그룹 프로세스끼리 나눠 씀), 막힌 경로 재확인 주기 (초)
+REST_CONCURRENCY = 8
+REST_RESERVED_SLOTS = 2
+REST_GLOBAL_RATE = 45
+REST_POLL_INTERVAL = 0.05
+# REST 요청 우선순위 (낮을수록 먼저): 티켓 생성 > 일반 > 로그/트랜스크립트 등 백그라운드 작업
+# 상호작용 응답과 후속 메시지는 HTTPClient.request를 거치지 않으므로 대기열에 들어오지 않음
+REST_PRIORITIES = {"create": 0, "default": 1, "background": 2}
+# 캐시에 없어 REST로 조회한 멤버를 기억하는 개수와 시간 (초)
+MEMBER_CACHE_SIZE = 1024
+MEMBER_CACHE_TTL = 300
+# 참여자 추가 한 번에 받는 최대 사용자 수, 캐시에 없는 멤버를 동시에 조회하는 최대 수
+PARTICIPANT_ADD_LIMIT = 25
+MEMBER_FETCH_CONCURRENCY = 4
+# 마지막으로 동기화한 슬래시 명령어 구성의 해시 (같으면 동기화 생략, TICKET_FORCE_SYNC=1이면 항상 동기화)
+COMMAND_FINGERPRINT_PATH = 'command_fingerprint.txt'
+FORCE_COMMAND_SYNC = os.environ.get("TICKET_FORCE_SYNC") == "1"
+# 샤딩 설정 (실행기가 프로세스마다 환경 변수로 전달, 비어 있으면 디스코드 권장 샤드 수 사용)
+SHARD_COUNT: Optional[int] = int(os.environ["TICKET_SHARD_COUNT"]) if os.environ.get("TICKET_SHARD_COUNT") else None
+SHARD_IDS: Optional[List[int]] = [int(i) for i in os.environ["TICKET_SHARD_IDS"].split(",")] if os.environ.get("TICKET_SHARD_IDS") else None
+PROCESS_INDEX = int(os.environ.get("TICKET_PROCESS_INDEX", "0"))
+PROCESS_COUNT = int(os.environ.get("TICKET_PROCESS_COUNT", "1"))
+# 변경 기록에 남기는 이 프로세스의 식별자 (자기 변경은 다시 적용하지 않음)
+PROCESS_ORIGIN = f"{PROCESS_INDEX}:{os.getpid()}"
+# 다른 프로세스의 변경을 확인하는 주기 (초)와 변경 기록 보관 시간 (초)
+CHANGE_POLL_INTERVAL = 1.0
+CHANGE_RETENTION = 3600
+
+# 성능 지표
+class Histogram:
+    """고정 구간 누적 히스토그램입니다 (Prometheus 형식)."""
+    __slots__ = ("counts", "sum", "count")
+    
+    BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.BOUNDS, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """구간 상한으로 q 분위수를 추정합니다."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return math.inf
+
+class Timer:
+    """with 블록의 실행 시간을 히스토그램에 기록합니다."""
+    __slots__ = ("metrics", "key", "start")
+    
+    def __init__(self, metrics: "Metrics", key: tuple):
+        self.metrics = metrics
+        self.key = key
+        self.start = 0.0
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe_key(self.key, time.perf_counter() - self.start)
+
+class Metrics:
+    """처리기/단계별 지연 시간, REST 호출 수, 속도 제한 대기, 이벤트 루프 지연을 모읍니다."""
+    PREFIX = "ticketbot_"
+    BOUND_LABELS = tuple(str(bound) for bound in Histogram.BOUNDS) + ("+Inf",)
+    
+    def __init__(self):
+        # (이름, 레이블) -> 히스토그램/카운터/게이지
+        self.histograms: Dict[tuple, Histogram] = {}
+        self.counters: Dict[tuple, float] = {}
+        self.gauges: Dict[tuple, float] = {}
+    
+    @staticmethod
+    def key(name: str, labels: dict) -> tuple:
+        return (name, tuple(sorted(labels.items())))
+    
+    def time(self, name: str, **labels) -> Timer:
+        return Timer(self, self.key(name, labels))
+    
+    def observe(self, name: str, value: float, **labels):
+        self.observe_key(self.key(name, labels), value)
+    
+    def observe_key(self, key: tuple, value: float):
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+    
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self.key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+    
+    def set(self, name: str, value: float, **labels):
+        self.gauges[self.key(name, labels)] = value
+    
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        return self.histograms.get(self.key(name, labels))
+    
+    def total(self, name: str) -> float:
+        """레이블과 상관없이 카운터 합계를 반환합니다."""
+        return sum(value for (counter, _), value in self.counters.items() if counter == name)
+    
+    @staticmethod
+    def format_labels(labels: tuple, extra: str = "") -> str:
+        parts = [f'{key}="{str(value)}"' for key, value in labels]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+    
+    def render(self) -> str:
+        """Prometheus 텍스트 형식으로 변환합니다."""
+        lines = []
+        for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+            for name in sorted({key[0] for key in values}):
+                lines.append(f"# TYPE {self.PREFIX}{name} {kind}")
+                for (metric, labels), value in values.items():
+                    if metric == name:
+                        lines.append(f"{self.PREFIX}{name}{self.format_labels(labels)} {value}")
+        for name in sorted({key[0] for key in self.histograms}):
+            lines.append(f"# TYPE {self.PREFIX}{name} histogram")
+            for (metric, labels), histogram in self.histograms.items():
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.BOUND_LABELS, histogram.counts):
+                    cumulative += count
+                    bucket_labels = self.format_labels(labels, 'le="' + bound + '"')
+                    lines.append(f"{self.PREFIX}{name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.PREFIX}{name}_sum{self.format_labels(labels)} {histogram.sum}")
+                lines.append(f"{self.PREFIX}{name}_count{self.format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+class RateLimitLogHandler(logging.Handler):
+    """discord.py의 속도 제한 경고 로그를 세어 지표에 기록합니다.
+    
+    on_limit이 주어지면 429 응답을 받은 경로(버킷)와 대기 시간을 넘겨줍니다. 전역 제한이면 버킷은 None입니다.
+    """
+    def __init__(self, metrics: Metrics, on_limit: Optional[Callable[[Optional[str], float], None]] = None):
+        super().__init__(level=logging.WARNING)
+        self.metrics = metrics
+        self.on_limit = on_limit
+    
+    def emit(self, record: logging.LogRecord):
+        message = str(record.msg)
+        if "rate limit" not in message.lower():
+            return
+        self.metrics.inc("ratelimit_waits_total", source="discord")
+        if self.on_limit is None or not isinstance(record.args, tuple) or not record.args:
+            return
+        try:
+            if message.startswith("We are being rate limited") and len(record.args) == 2:
+                self.on_limit(str(record.args[1]), float(record.args[0]))
+            elif message.startswith("Global rate limit"):
+                self.on_limit(None, float(record.args[0]))
+        except (TypeError, ValueError):
+            pass
+
+metrics = Metrics()
+
+# 티켓 채널 토픽 형식 (개설자와 티켓 종류를 기록)
+TICKET_TOPIC_PREFIX = "🎫"
+# 미리 만들어 둔 대기 채널의 이름과 토픽
+POOL_CHANNEL_NAME = "ticket-pool"
+POOL_TOPIC = f"{TICKET_TOPIC_PREFIX} pool"
+
+def build_ticket_topic(opener_id: int, ticket_type: str) -> str:
+    """티켓 채널 토픽 문자열을 생성합니다."""
+    return f"{TICKET_TOPIC_PREFIX} opener:{opener_id} | type:{ticket_type}"
+
+def parse_ticket_topic(topic: Optional[str]) -> Optional[Tuple[int, str]]:
+    """티켓 채널 토픽에서 (개설자 ID, 티켓 종류)를 읽습니다."""
+    if not topic or not topic.startswith(TICKET_TOPIC_PREFIX):
+        return None
+    fields = {}
+    for part in topic[len(TICKET_TOPIC_PREFIX):].split(" | "):
+        key, sep, value = part.strip().partition(":")
+        if sep:
+            fields[key] = value
+    try:
+        return int(fields["opener"]), fields["type"]
+    except (KeyError, ValueError):
+        return None
+
+# 열린 티켓 인덱스
+class TicketIndex:
+    """서버별로 열린 티켓을 사용자 ID와 티켓 종류로 색인합니다."""
+    def __init__(self):
+        # 채널 ID -> (서버 ID, 사용자 ID, 티켓 종류)
+        self.channels: Dict[int, Tuple[int, int, str]] = {}
+        # (서버 ID, 사용자 ID) -> 티켓 종류 -> 채널 ID 집합
+        self.by_user: Dict[Tuple[int, int], Dict[str, Set[int]]] = {}
+        # 서버 ID -> 티켓 종류 -> 열린 티켓 수
+        self.by_type: Dict[int, Dict[str, int]] = {}
+        self.user_totals: Dict[Tuple[int, int], int] = {}
+        self.guild_totals: Dict[int, int] = {}
+    
+    def add(self, guild_id: int, channel_id: int, user_id: int, ticket_type: str):
+        """티켓 채널을 인덱스에 추가합니다. 이미 있으면 정보를 갱신합니다."""
+        if self.channels.get(channel_id) == (guild_id, user_id, ticket_type):
+            return
+        self.remove(channel_id)
+        self.channels[channel_id] = (guild_id, user_id, ticket_type)
+        self.by_user.setdefault((guild_id, user_id), {}).setdefault(ticket_type, set()).add(channel_id)
+        types = self.by_type.setdefault(guild_id, {})
+        types[ticket_type] = types.get(ticket_type, 0) + 1
+        self.user_totals[(guild_id, user_id)] = self.user_totals.get((guild_id, user_id), 0) + 1
+        self.guild_totals[guild_id] = self.guild_totals.get(guild_id, 0) + 1
+    
+    def remove(self, channel_id: int):
+        """티켓 채널을 인덱스에서 제거합니다."""
+        entry = self.channels.pop(channel_id, None)
+        if entry is None:
+            return
+        guild_id, user_id, ticket_type = entry
+        user_key = (guild_id, user_id)
+        user_types = self.by_user[user_key]
+        user_types[ticket_type].discard(channel_id)
+        if not user_types[ticket_type]:
+            del user_types[ticket_type]
+        if not user_types:
+            del self.by_user[user_key]
+        types = self.by_type[guild_id]
+        types[ticket_type] -= 1
+        if not types[ticket_type]:
+            del types[ticket_type]
+        self.user_totals[user_key] -= 1
+        if not self.user_totals[user_key]:
+            del self.user_totals[user_key]
+        self.guild_totals[guild_id] -= 1
+    
+    def clear_guild(self, guild_id: int):
+        """서버의 모든 티켓을 인덱스에서 제거합니다."""
+        for channel_id in [cid for cid, entry in self.channels.items() if entry[0] == guild_id]:
+            self.remove(channel_id)
+    
+    def get(self, channel_id: int) -> Optional[Tuple[int, int, str]]:
+        return self.channels.get(channel_id)
+    
+    def user_count(self, guild_id: int, user_id: int, ticket_type: Optional[str] = None) -> int:
+        """사용자의 열린 티켓 수를 반환합니다."""
+        if ticket_type is None:
+            return self.user_totals.get((guild_id, user_id), 0)
+        return len(self.by_user.get((guild_id, user_id), {}).get(ticket_type, ()))
+    
+    def type_counts(self, guild_id: int) -> Dict[str, int]:
+        """서버의 티켓 종류별 열린 티켓 수를 반환합니다."""
+        return self.by_type.get(guild_id, {})
+    
+    def guild_count(self, guild_id: int) -> int:
+        """서버의 열린 티켓 수를 반환합니다."""
+        return self.guild_totals.get(guild_id, 0)
+
+# 프로세스 간 변경 알림
+def create_change_table(conn: sqlite3.Connection):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS changes ("
+        "seq INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT NOT NULL, kind TEXT NOT NULL, "
+        "guild_id INTEGER, key TEXT NOT NULL, ts REAL NOT NULL)"
+    )
+
+def record_changes(conn: sqlite3.Connection, kind: str, changes: List[Tuple[Optional[int], str]]):
+    """같은 트랜잭션 안에서 (서버 ID, 키) 변경을 기록합니다."""
+    now = datetime.datetime.now().timestamp()
+    conn.executemany(
+        "INSERT INTO changes (origin, kind, guild_id, key, ts) VALUES (?, ?, ?, ?, ?)",
+        [(PROCESS_ORIGIN, kind, guild_id, key, now) for guild_id, key in changes]
+    )
+
+class ChangeFeed:
+    """공유 데이터베이스의 변경 기록을 읽어 다른 프로세스의 설정/티켓 변경을 알려 줍니다."""
+    def __init__(self, path: str = DATABASE_PATH):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            create_change_table(self.conn)
+    
+    def latest(self) -> int:
+        """마지막 변경 번호를 반환합니다. 시작 시점 이전의 변경은 로드한 상태에 이미 반영되어 있습니다."""
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+    
+    def poll(self, after: int, origin: str = PROCESS_ORIGIN) -> Tuple[int, List[Tuple[str, Optional[int], str]]]:
+        """after 이후 다른 프로세스가 남긴 변경을 (마지막 번호, [(종류, 서버 ID, 키)])로 반환합니다."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT seq, origin, kind, guild_id, key FROM changes WHERE seq > ? ORDER BY seq", (after,)
+            ).fetchall()
+        if rows:
+            after = rows[-1][0]
+        changes = list(dict.fromkeys((kind, guild_id, key) for _, row_origin, kind, guild_id, key in rows if row_origin != origin))
+        return after, changes
+    
+    def prune(self, before: float) -> int:
+        with self.lock, self.conn:
+            return self.conn.execute("DELETE FROM changes WHERE ts < ?", (before,)).rowcount
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def ticket_category_ids(settings: dict) -> List[int]:
+    """서버 설정의 티켓 카테고리 ID 목록을 반환합니다. 이전 설정은 category_id 하나만 있습니다."""
+    category_ids = settings.get("category_ids")
+    if category_ids:
+        return category_ids
+    return [settings["category_id"]] if settings.get("category_id") else []
+
+# 설정 저장소
+class SettingsStore:
+    """서버별 티켓 설정 저장소의 기본 클래스입니다. 모든 메서드는 이벤트 루프 밖에서 호출됩니다.
+    
+    예외로 load_guild는 미리 읽지 못한 서버를 조회할 때 이벤트 루프에서 불릴 수 있으므로 기록 잠금을 잡지 않아야 합니다.
+    조회 메서드는 저장소 내부 객체가 아닌 새 dict를 돌려줍니다.
+    """
+    def load_all(self) -> Dict[str, dict]:
+        raise NotImplementedError
+    
+    def load_guild(self, guild_id: str) -> Optional[dict]:
+        """서버 하나의 설정을 다시 읽습니다."""
+        return self.load_all().get(guild_id)
+    
+    def load_guilds(self, guild_ids: List[str]) -> Dict[str, dict]:
+        """여러 서버의 설정을 한 번에 읽습니다. 설정이 없는 서버는 빠집니다."""
+        settings = self.load_all()
+        return {guild_id: settings[guild_id] for guild_id in guild_ids if guild_id in settings}
+    
+    def save_guilds(self, guilds: Dict[str, Optional[dict]]):
+        """변경된 서버의 설정만 기록합니다. 값이 None이면 삭제합니다."""
+        raise NotImplementedError
+    
+    def close(self):
+        pass
+
+class SQLiteSettingsStore(SettingsStore):
+    """서버 하나당 한 행으로 설정을 저장하는 SQLite(WAL) 저장소입니다."""
+    def __init__(self, path: str = DATABASE_PATH, legacy_json_path: str = SETTINGS_JSON_PATH):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS guild_settings ("
+            "guild_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        create_change_table(self.conn)
+        self.conn.commit()
+        # 조회 전용 연결: WAL에서는 기록 중에도 읽을 수 있으므로, 이벤트 루프에서 읽더라도 기록 잠금을 기다리지 않음
+        self.read_lock = threading.Lock()
+        self.read_conn = sqlite3.connect(path, check_same_thread=False)
+        self.import_legacy_json(legacy_json_path)
+    
+    def import_legacy_json(self, json_path: str):
+        """처음 시작할 때 기존 JSON 설정 파일을 가져옵니다."""
+        with self.lock:
+            if self.conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+                return
+            settings = {}
+            if json_path and os.path.exists(json_path):
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                    if content:
+                        settings = json.loads(content)
+            now = datetime.datetime.now().timestamp()
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO guild_settings (guild_id, data, updated_at) VALUES (?, ?, ?)",
+                    [(guild_id, json.dumps(data, ensure_ascii=False), now) for guild_id, data in settings.items()]
+                )
+                self.conn.execute("INSERT INTO meta (key, value) VALUES ('json_imported', ?)", (str(now),))
+            if settings:
+                print(f"기존 JSON 설정 {len(settings)}개 서버를 가져왔습니다.")
+    
+    def load_all(self) -> Dict[str, dict]:
+        with self.lock:
+            rows = self.conn.execute("SELECT guild_id, data FROM guild_settings").fetchall()
+        return {guild_id: json.loads(data) for guild_id, data in rows}
+    
+    def load_guild(self, guild_id: str) -> Optional[dict]:
+        with self.read_lock:
+            row = self.read_conn.execute("SELECT data FROM guild_settings WHERE guild_id = ?", (guild_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def load_guilds(self, guild_ids: List[str]) -> Dict[str, dict]:
+        settings = {}
+        # SQLite 변수 개수 제한에 맞춰 나눠서 조회
+        for start in range(0, len(guild_ids), 500):
+            chunk = guild_ids[start:start + 500]
+            with self.read_lock:
+                rows = self.read_conn.execute(
+                    f"SELECT guild_id, data FROM guild_settings WHERE guild_id IN ({', '.join('?' for _ in chunk)})", chunk
+                ).fetchall()
+            settings.update((guild_id, json.loads(data)) for guild_id, data in rows)
+        return settings
+    
+    def save_guilds(self, guilds: Dict[str, Optional[dict]]):
+        now = datetime.datetime.now().timestamp()
+        with self.lock, self.conn:
+            for guild_id, data in guilds.items():
+                if data is None:
+                    self.conn.execute("DELETE FROM guild_settings WHERE guild_id = ?", (guild_id,))
+                else:
+                    self.conn.execute(
+                        "INSERT INTO guild_settings (guild_id, data, updated_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(guild_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                        (guild_id, json.dumps(data, ensure_ascii=False), now)
+                    )
+            # 다른 프로세스가 캐시를 갱신하도록 알림
+            record_changes(self.conn, "settings", [(int(guild_id), guild_id) for guild_id in guilds])
+    
+    def close(self):
+        with self.read_lock:
+            self.read_conn.close()
+        with self.lock:
+            self.conn.close()
+
+class JsonSettingsStore(SettingsStore):
+    """전체 설정을 JSON 파일 하나에 저장하는 저장소입니다. 임시 파일을 거쳐 원자적으로 교체합니다."""
+    def __init__(self, path: str = SETTINGS_JSON_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        # 기록에만 쓰는 전체 설정 (조회 결과와 객체를 공유하지 않음)
+        self.data: Dict[str, dict] = {}
+        self.loaded = False
+    
+    def read_file(self) -> Dict[str, dict]:
+        # 파일은 os.replace로 통째로 바뀌므로 잠금 없이 읽어도 쓰다 만 내용을 보지 않음
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        return json.loads(content) if content else {}
+    
+    def load_all(self) -> Dict[str, dict]:
+        # 매번 파일에서 새로 읽은 사본을 돌려주어, 호출한 쪽의 변경이 기록 중인 self.data와 섞이지 않음
+        return self.read_file()
+    
+    def save_guilds(self, guilds: Dict[str, Optional[dict]]):
+        with self.lock:
+            if not self.loaded:
+                self.data = self.read_file()
+                self.loaded = True
+            for guild_id, data in guilds.items():
+                if data is None:
+                    self.data.pop(guild_id, None)
+                else:
+                    self.data[guild_id] = data
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+class LazySettings(dict):
+    """서버 설정을 처음 사용할 때 저장소에서 읽어 오는 dict입니다. 준비된 서버는 preload로 미리 한 번에 읽습니다."""
+    def __init__(self, store: Optional[SettingsStore] = None):
+        super().__init__()
+        self.store = store
+        # 저장소에 설정이 없다고 확인된 서버 ID
+        self.missing: Set[str] = set()
+    
+    def _load(self, guild_id) -> bool:
+        if dict.__contains__(self, guild_id):
+            return True
+        if self.store is None or guild_id in self.missing or not isinstance(guild_id, str):
+            return False
+        # 미리 읽지 못한 서버에만 해당하는 드문 경우로, 기본 키 조회 한 번 (저장소의 기록 잠금은 잡지 않음)
+        settings = self.store.load_guild(guild_id)
+        if settings is None:
+            self.missing.add(guild_id)
+            return False
+        dict.__setitem__(self, guild_id, settings)
+        metrics.inc("settings_lazy_loads_total")
+        return True
+    
+    def __contains__(self, guild_id) -> bool:
+        return self._load(guild_id)
+    
+    def __getitem__(self, guild_id):
+        self._load(guild_id)
+        return dict.__getitem__(self, guild_id)
+    
+    def get(self, guild_id, default=None):
+        return dict.__getitem__(self, guild_id) if self._load(guild_id) else default
+    
+    def __setitem__(self, guild_id, settings):
+        self.missing.discard(guild_id)
+        dict.__setitem__(self, guild_id, settings)
+    
+    async def preload(self, guild_ids: List[str]):
+        """아직 읽지 않은 서버들의 설정을 이벤트 루프 밖에서 한 번에 읽습니다."""
+        pending = [guild_id for guild_id in guild_ids if not dict.__contains__(self, guild_id) and guild_id not in self.missing]
+        if self.store is None or not pending:
+            return
+        loaded = await asyncio.to_thread(self.store.load_guilds, pending)
+        for guild_id in pending:
+            if guild_id in loaded:
+                # 읽는 사이에 바뀐 설정은 덮어쓰지 않음
+                if not dict.__contains__(self, guild_id):
+                    dict.__setitem__(self, guild_id, loaded[guild_id])
+            elif not dict.__contains__(self, guild_id):
+                self.missing.add(guild_id)
+
+# 티켓 기록
+class TicketRecord:
+    """티켓 하나의 상태를 담는 가벼운 행입니다. 처리 시간 측정도 이 행으로 합니다."""
+    __slots__ = ("channel_id", "guild_id", "opener_id", "ticket_type", "priority", "status",
+                 "created_at", "closed_at", "assignee_id", "closed_by")
+    
+    def __init__(self, channel_id: int, guild_id: int, opener_id: int, ticket_type: str,
+                 priority: Optional[str] = None, status: str = "open",
+                 created_at: Optional[float] = None, closed_at: Optional[float] = None,
+                 assignee_id: Optional[int] = None, closed_by: Optional[int] = None):
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.opener_id = opener_id
+        self.ticket_type = ticket_type
+        self.priority = priority
+        self.status = status
+        self.created_at = created_at if created_at is not None else datetime.datetime.now().timestamp()
+        self.closed_at = closed_at
+        self.assignee_id = assignee_id
+        self.closed_by = closed_by
+    
+    def close(self, closed_by: Optional[int] = None):
+        self.status = "closed"
+        self.closed_at = datetime.datetime.now().timestamp()
+        self.closed_by = closed_by
+    
+    def get_duration(self) -> datetime.timedelta:
+        end = self.closed_at if self.closed_at is not None else datetime.datetime.now().timestamp()
+        return datetime.timedelta(seconds=end - self.created_at)
+    
+    def as_row(self) -> tuple:
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+class TicketStore:
+    """티켓 기록을 SQLite에 보관합니다. 모든 메서드는 이벤트 루프 밖에서 호출됩니다."""
+    def __init__(self, path: str = DATABASE_PATH):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS tickets ("
+                "channel_id INTEGER PRIMARY KEY, guild_id INTEGER NOT NULL, opener_id INTEGER NOT NULL, "
+                "ticket_type TEXT NOT NULL, priority TEXT, status TEXT NOT NULL, "
+                "created_at REAL NOT NULL, closed_at REAL, assignee_id INTEGER, closed_by INTEGER)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS tickets_guild ON tickets (guild_id, status)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS tickets_opener ON tickets (guild_id, opener_id, status)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS tickets_status ON tickets (status)")
+            create_change_table(self.conn)
+    
+    def load_open(self) -> List[TicketRecord]:
+        """열린 티켓 기록을 한 번에 읽습니다."""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(TicketRecord.__slots__)} FROM tickets WHERE status = 'open'"
+            ).fetchall()
+        return [TicketRecord(*row) for row in rows]
+    
+    def load(self, channel_ids: List[int]) -> List[TicketRecord]:
+        """채널 ID로 티켓 기록을 읽습니다."""
+        if not channel_ids:
+            return []
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(TicketRecord.__slots__)} FROM tickets "
+                f"WHERE channel_id IN ({', '.join('?' for _ in channel_ids)})",
+                channel_ids
+            ).fetchall()
+        return [TicketRecord(*row) for row in rows]
+    
+    def save(self, records: List[TicketRecord]):
+        """티켓 기록을 추가하거나 갱신합니다."""
+        rows = [record.as_row() for record in records]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO tickets ({', '.join(TicketRecord.__slots__)}) "
+                f"VALUES ({', '.join('?' for _ in TicketRecord.__slots__)})",
+                rows
+            )
+            record_changes(self.conn, "ticket", [(record.guild_id, str(record.channel_id)) for record in records])
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class CloseJobStore:
+    """진행 중인 일괄 종료 작업을 보관해 재시작 후 이어서 처리합니다. 모든 메서드는 이벤트 루프 밖에서 호출됩니다."""
+    def __init__(self, path: str = DATABASE_PATH):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            # stage: pending(아직 처리 전) -> archived(기록/로그 완료, 삭제 대기)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS close_jobs ("
+                "channel_id INTEGER PRIMARY KEY, guild_id INTEGER NOT NULL, closed_by INTEGER, "
+                "reason TEXT, stage TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+    
+    def load(self) -> List[tuple]:
+        with self.lock:
+            return self.conn.execute(
+                "SELECT channel_id, guild_id, closed_by, reason, stage FROM close_jobs ORDER BY created_at"
+            ).fetchall()
+    
+    def add(self, jobs: List[tuple]):
+        """(채널 ID, 서버 ID, 닫은 사람 ID, 사유) 작업을 추가합니다. 이미 있는 작업은 그대로 둡니다."""
+        now = datetime.datetime.now().timestamp()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO close_jobs (channel_id, guild_id, closed_by, reason, stage, created_at) "
+                "VALUES (?, ?, ?, ?, 'pending', ?)",
+                [(*job, now) for job in jobs]
+            )
+    
+    def set_stage(self, channel_id: int, stage: str):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE close_jobs SET stage = ? WHERE channel_id = ?", (stage, channel_id))
+    
+    def remove(self, channel_id: int):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM close_jobs WHERE channel_id = ?", (channel_id,))
+    
+    def remove_guild(self, guild_id: int):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM close_jobs WHERE guild_id = ?", (guild_id,))
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class ScheduledAction:
+    """정해진 시각에 실행할 티켓 작업 하나입니다. 저장되지 않은 작업은 action_id가 None입니다."""
+    __slots__ = ("action_id", "due", "kind", "guild_id", "channel_id", "payload", "attempts")
+    
+    def __init__(self, action_id: Optional[int], due: float, kind: str, guild_id: Optional[int] = None,
+                 channel_id: Optional[int] = None, payload: Optional[dict] = None):
+        self.action_id = action_id
+        self.due = due
+        self.kind = kind
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.payload = payload or {}
+        # 이번 실행에서 다시 시도한 횟수 (저장하지 않음)
+        self.attempts = 0
+
+class ActionStore:
+    """예약 작업을 SQLite에 보관해 재시작 후에도 실행되게 합니다. 모든 메서드는 이벤트 루프 밖에서 호출됩니다."""
+    def __init__(self, path: str = DATABASE_PATH):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS scheduled_actions ("
+                "action_id INTEGER PRIMARY KEY AUTOINCREMENT, due REAL NOT NULL, kind TEXT NOT NULL, "
+                "guild_id INTEGER, channel_id INTEGER, payload TEXT)"
+            )
+    
+    def load(self) -> List[ScheduledAction]:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT action_id, due, kind, guild_id, channel_id, payload FROM scheduled_actions"
+            ).fetchall()
+        return [ScheduledAction(*row[:5], json.loads(row[5]) if row[5] else None) for row in rows]
+    
+    def add(self, action: ScheduledAction) -> int:
+        with self.lock, self.conn:
+            return self.conn.execute(
+                "INSERT INTO scheduled_actions (due, kind, guild_id, channel_id, payload) VALUES (?, ?, ?, ?, ?)",
+                (action.due, action.kind, action.guild_id, action.channel_id,
+                 json.dumps(action.payload, ensure_ascii=False) if action.payload else None)
+            ).lastrowid
+    
+    def remove(self, action_ids: List[int]):
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM scheduled_actions WHERE action_id = ?", [(i,) for i in action_ids])
+    
+    def remove_guild(self, guild_id: int):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM scheduled_actions WHERE guild_id = ?", (guild_id,))
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def create_settings_store(backend: str = SETTINGS_BACKEND) -> SettingsStore:
+    """설정 저장소 종류에 맞는 저장소를 생성합니다."""
+    if backend == "sqlite":
+        return SQLiteSettingsStore()
+    if backend == "json":
+        return JsonSettingsStore()
+    raise ValueError(f"알 수 없는 설정 저장소: {backend}")
+
+# 처리 시간 분위수 스케치
+class QuantileSketch:
+    """상대 오차가 보장되는 로그 구간 히스토그램입니다. 값 개수와 상관없이 메모리가 일정합니다."""
+    __slots__ = ("buckets", "zero_count", "count")
+    
+    GAMMA = (1 + STATS_SKETCH_ACCURACY) / (1 - STATS_SKETCH_ACCURACY)
+    LOG_GAMMA = math.log(GAMMA)
+    
+    def __init__(self, buckets: Optional[Dict[int, int]] = None, zero_count: int = 0):
+        self.buckets: Dict[int, int] = buckets or {}
+        self.zero_count = zero_count
+        self.count = zero_count + sum(self.buckets.values())
+    
+    def add(self, value: float):
+        self.count += 1
+        if value <= 1e-9:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self.LOG_GAMMA)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+    
+    def merge(self, other: "QuantileSketch"):
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """q 분위수 추정값을 반환합니다. 값이 없으면 None입니다."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                return 2 * self.GAMMA ** key / (self.GAMMA + 1)
+        return 2 * self.GAMMA ** max(self.buckets) / (self.GAMMA + 1)
+    
+    def to_json(self) -> str:
+        return json.dumps({"z": self.zero_count, "b": self.buckets})
+    
+    @classmethod
+    def from_json(cls, data: Optional[str]) -> "QuantileSketch":
+        if not data:
+            return cls()
+        raw = json.loads(data)
+        return cls({int(key): count for key, count in raw.get("b", {}).items()}, raw.get("z", 0))
+
+def stats_day(ts: float) -> str:
+    return datetime.datetime.fromtimestamp(ts).strftime("d:%Y%m%d")
+
+def stats_hour(ts: float) -> str:
+    return datetime.datetime.fromtimestamp(ts).strftime("h:%Y%m%d%H")
+
+# 티켓 통계
+class TicketStats:
+    """티켓 생성/닫힘 이벤트로 갱신되는 서버별 누적 통계입니다.
+    
+    집계 단위는 (서버 ID, 기간, 티켓 종류)이며 기간은 "all", 일별 "d:YYYYMMDD", 시간별 "h:YYYYMMDDHH"입니다.
+    티켓 종류가 빈 문자열이면 서버 전체 합계입니다. 시간별 집계는 서버 전체만 유지합니다.
+    """
+    def __init__(self):
+        # 집계 키 -> [생성 수, 닫힘 수]
+        self.counters: Dict[Tuple[int, str, str], List[int]] = {}
+        # 집계 키 -> 처리 시간 스케치 ("all"과 일별만)
+        self.sketches: Dict[Tuple[int, str, str], QuantileSketch] = {}
+        self.types: Dict[int, Set[str]] = {}
+        # 아직 저장되지 않은 집계 키
+        self.dirty: Set[Tuple[int, str, str]] = set()
+    
+    def _keys(self, guild_id: int, ticket_type: str, ts: float) -> List[Tuple[int, str, str]]:
+        day = stats_day(ts)
+        return [
+            (guild_id, "all", ""), (guild_id, "all", ticket_type),
+            (guild_id, day, ""), (guild_id, day, ticket_type),
+            (guild_id, stats_hour(ts), ""),
+        ]
+    
+    def record_created(self, guild_id: int, ticket_type: str, created_at: float):
+        self.types.setdefault(guild_id, set()).add(ticket_type)
+        for key in self._keys(guild_id, ticket_type, created_at):
+            self.counters.setdefault(key, [0, 0])[0] += 1
+            self.dirty.add(key)
+    
+    def record_closed(self, guild_id: int, ticket_type: str, created_at: float, closed_at: float):
+        self.types.setdefault(guild_id, set()).add(ticket_type)
+        duration = max(closed_at - created_at, 0)
+        for key in self._keys(guild_id, ticket_type, closed_at):
+            self.counters.setdefault(key, [0, 0])[1] += 1
+            if not key[1].startswith("h:"):
+                self.sketches.setdefault(key, QuantileSketch()).add(duration)
+            self.dirty.add(key)
+    
+    def window_periods(self, days: int, now: Optional[float] = None) -> List[str]:
+        """최근 days일의 일별 기간 키를 오래된 순서로 반환합니다."""
+        now = now if now is not None else datetime.datetime.now().timestamp()
+        return [stats_day(now - 86400 * offset) for offset in range(days - 1, -1, -1)]
+    
+    def summary(self, guild_id: int, days: Optional[int] = None) -> dict:
+        """기간 내 생성/닫힘 수, 종류별 합계, 처리 시간 p50/p95, 추이를 계산합니다. days가 None이면 전체 기간입니다."""
+        periods = ["all"] if days is None else self.window_periods(days)
+        created = closed = 0
+        by_type: Dict[str, List[int]] = {}
+        sketch = QuantileSketch()
+        trend = []
+        for period in periods:
+            counts = self.counters.get((guild_id, period, ""), (0, 0))
+            created += counts[0]
+            closed += counts[1]
+            trend.append((period, counts[0], counts[1]))
+            if (guild_id, period, "") in self.sketches:
+                sketch.merge(self.sketches[(guild_id, period, "")])
+            for ticket_type in self.types.get(guild_id, ()):
+                type_counts = self.counters.get((guild_id, period, ticket_type))
+                if type_counts:
+                    totals = by_type.setdefault(ticket_type, [0, 0])
+                    totals[0] += type_counts[0]
+                    totals[1] += type_counts[1]
+        return {
+            "created": created,
+            "closed": closed,
+            "by_type": by_type,
+            "p50": sketch.quantile(0.5),
+            "p95": sketch.quantile(0.95),
+            "trend": trend if days is not None else [],
+        }
+    
+    def hourly_trend(self, guild_id: int, hours: int = 24) -> List[Tuple[str, int, int]]:
+        """최근 hours시간의 시간별 (기간, 생성 수, 닫힘 수)를 반환합니다."""
+        now = datetime.datetime.now().timestamp()
+        trend = []
+        for offset in range(hours - 1, -1, -1):
+            period = stats_hour(now - 3600 * offset)
+            counts = self.counters.get((guild_id, period, ""), (0, 0))
+            trend.append((period, counts[0], counts[1]))
+        return trend
+    
+    def take_dirty(self) -> List[tuple]:
+        """저장할 행 목록을 만들고 변경 표시를 지웁니다."""
+        rows = []
+        for key in self.dirty:
+            counts = self.counters.get(key, (0, 0))
+            sketch = self.sketches.get(key)
+            rows.append((key[0], key[1], key[2], counts[0], counts[1], sketch.to_json() if sketch else None))
+        self.dirty.clear()
+        return rows
+    
+    def load_rows(self, rows):
+        for guild_id, period, ticket_type, created, closed, sketch in rows:
+            self.counters[(guild_id, period, ticket_type)] = [created, closed]
+            if sketch:
+                self.sketches[(guild_id, period, ticket_type)] = QuantileSketch.from_json(sketch)
+            if ticket_type:
+                self.types.setdefault(guild_id, set()).add(ticket_type)
+    
+    def prune_hourly(self, cutoff: str):
+        """cutoff보다 오래된 시간별 집계를 메모리에서 지웁니다."""
+        for key in [key for key in self.counters if key[1].startswith("h:") and key[1] < cutoff]:
+            del self.counters[key]
+            self.dirty.discard(key)
+
+class StatsStore:
+    """누적 통계를 SQLite에 보관합니다. 모든 메서드는 이벤트 루프 밖에서 호출됩니다."""
+    def __init__(self, path: str = DATABASE_PATH):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS ticket_stats ("
+                "guild_id INTEGER NOT NULL, period TEXT NOT NULL, ticket_type TEXT NOT NULL, "
+                "created INTEGER NOT NULL, closed INTEGER NOT NULL, sketch TEXT, "
+                "PRIMARY KEY (guild_id, period, ticket_type))"
+            )
+    
+    def load(self) -> TicketStats:
+        """저장된 통계를 읽습니다. 통계가 비어 있으면 기존 티켓 기록으로 한 번 채웁니다."""
+        stats = TicketStats()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT guild_id, period, ticket_type, created, closed, sketch FROM ticket_stats"
+            ).fetchall()
+            stats.load_rows(rows)
+            if rows:
+                return stats
+            has_tickets = self.conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'tickets'"
+            ).fetchone()
+            if not has_tickets:
+                return stats
+            cursor = self.conn.execute("SELECT guild_id, ticket_type, created_at, closed_at FROM tickets")
+            for guild_id, ticket_type, created_at, closed_at in cursor:
+                stats.record_created(guild_id, ticket_type, created_at)
+                if closed_at is not None:
+                    stats.record_closed(guild_id, ticket_type, created_at, closed_at)
+        return stats
+    
+    def save(self, rows: List[tuple], hourly_cutoff: str):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO ticket_stats (guild_id, period, ticket_type, created, closed, sketch) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.execute("DELETE FROM ticket_stats WHERE period LIKE 'h:%' AND period < ?", (hourly_cutoff,))
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+# 트랜스크립트 보관소
+class TranscriptArchive:
+    """닫힌 티켓의 트랜스크립트를 SQLite FTS5로 색인해 보관합니다. 모든 메서드는 이벤트 루프 밖에서 호출됩니다."""
+    def __init__(self, path: str = DATABASE_PATH):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS transcripts ("
+                "channel_id INTEGER PRIMARY KEY, guild_id INTEGER NOT NULL, channel_name TEXT NOT NULL, "
+                "opener_id INTEGER, ticket_type TEXT, closed_by INTEGER, "
+                "created_at REAL, closed_at REAL NOT NULL, message_count INTEGER NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS transcripts_closed ON transcripts (guild_id, closed_at)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS transcripts_opener ON transcripts (guild_id, opener_id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS transcripts_type ON transcripts (guild_id, ticket_type)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS transcripts_closer ON transcripts (guild_id, closed_by)")
+            # 본문은 페이지 단위로 나눠 색인 (검색 결과 발췌가 짧게 나오도록)
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS transcript_fts USING fts5("
+                "body, channel_id UNINDEXED, tokenize = 'unicode61')"
+            )
+    
+    def begin(self, channel_id: int):
+        """같은 채널의 이전 본문을 지우고 새로 기록할 준비를 합니다."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM transcript_fts WHERE channel_id = ?", (channel_id,))
+    
+    def add_chunk(self, channel_id: int, body: str):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT INTO transcript_fts (body, channel_id) VALUES (?, ?)", (body, channel_id))
+    
+    def finish(self, channel_id: int, metadata: dict, message_count: int):
+        """트랜스크립트 정보를 기록합니다."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO transcripts (channel_id, guild_id, channel_name, opener_id, ticket_type, "
+                "closed_by, created_at, closed_at, message_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (channel_id, metadata["guild_id"], metadata["channel_name"], metadata.get("opener_id"),
+                 metadata.get("ticket_type"), metadata.get("closed_by"), metadata.get("created_at"),
+                 metadata["closed_at"], message_count)
+            )
+    
+    @staticmethod
+    def build_query(text: str) -> str:
+        """사용자 입력을 FTS5 접두어 검색식으로 변환합니다."""
+        terms = [term.replace('"', '') for term in text.split()]
+        return " ".join(f'"{term}"*' for term in terms if term)
+    
+    def search(self, guild_id: int, text: str, opener_id: Optional[int] = None,
+               ticket_type: Optional[str] = None, limit: int = 5) -> List[tuple]:
+        """(채널 ID, 채널 이름, 개설자 ID, 티켓 종류, 닫은 시각, 발췌) 목록을 관련도 순으로 반환합니다."""
+        query = self.build_query(text)
+        if not query:
+            return []
+        sql = (
+            "SELECT t.channel_id, t.channel_name, t.opener_id, t.ticket_type, t.closed_at, "
+            "snippet(transcript_fts, 0, '**', '**', '…', 16) "
+            "FROM transcript_fts JOIN transcripts t ON t.channel_id = transcript_fts.channel_id "
+            "WHERE transcript_fts MATCH ? AND t.guild_id = ?"
+        )
+        params: list = [query, guild_id]
+        if opener_id is not None:
+            sql += " AND t.opener_id = ?"
+            params.append(opener_id)
+        if ticket_type:
+            sql += " AND t.ticket_type = ?"
+            params.append(ticket_type)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit * 4)
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        # 한 티켓의 여러 페이지가 걸리면 가장 관련도 높은 발췌만 사용
+        results = {}
+        for row in rows:
+            results.setdefault(row[0], row)
+        return list(results.values())[:limit]
+    
+    def compact(self, cutoff: float) -> int:
+        """보관 기간이 지난 트랜스크립트를 지우고 색인을 최적화합니다. 지운 개수를 반환합니다."""
+        with self.lock, self.conn:
+            expired = [row[0] for row in self.conn.execute(
+                "SELECT channel_id FROM transcripts WHERE closed_at < ?", (cutoff,)
+            )]
+            self.conn.executemany("DELETE FROM transcript_fts WHERE channel_id = ?", [(cid,) for cid in expired])
+            self.conn.execute("DELETE FROM transcripts WHERE closed_at < ?", (cutoff,))
+            self.conn.execute("INSERT INTO transcript_fts (transcript_fts) VALUES ('optimize')")
+        return len(expired)
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+# 채널 이름 변경 묶음 처리기
+class RenameCoalescer:
+    """채널별 이름 변경 요청을 모아 속도 제한이 허용할 때 마지막 값만 적용합니다."""
+    def __init__(self, bot: "TicketBot", limit: int = RENAME_LIMIT, window: float = RENAME_WINDOW):
+        self.bot = bot
+        self.limit = limit
+        self.window = window
+        # 채널 ID -> 적용 대기 중인 이름
+        self.pending: Dict[int, str] = {}
+        # 채널 ID -> 최근 이름 변경 시각
+        self.history: Dict[int, collections.deque] = {}
+        self.workers: Dict[int, asyncio.Task] = {}
+    
+    def request(self, channel_id: int, name: str):
+        """채널 이름 변경을 예약합니다. 이전에 대기 중이던 값은 덮어씁니다."""
+        self.pending[channel_id] = name
+        if channel_id not in self.workers:
+            self.workers[channel_id] = self.bot.loop.create_task(self._worker(channel_id))
+    
+    def delay(self, channel_id: int) -> float:
+        """다음 이름 변경까지 기다려야 하는 시간을 반환합니다."""
+        recent = self.history.get(channel_id)
+        if not recent:
+            return 0
+        now = time.monotonic()
+        while recent and now - recent[0] >= self.window:
+            recent.popleft()
+        if len(recent) < self.limit:
+            return 0
+        return self.window - (now - recent[0])
+    
+    def record(self, channel_id: int):
+        """코얼레서 밖에서 바꾼 이름도 채널의 변경 횟수에 셉니다."""
+        self.history.setdefault(channel_id, collections.deque()).append(time.monotonic())
+    
+    def cancel(self, channel_id: int):
+        """삭제된 채널의 대기 작업을 정리합니다."""
+        self.pending.pop(channel_id, None)
+        self.history.pop(channel_id, None)
+        worker = self.workers.pop(channel_id, None)
+        if worker:
+            worker.cancel()
+    
+    async def _worker(self, channel_id: int):
+        rest_priority.set("background")
+        try:
+            while channel_id in self.pending:
+                wait = self.delay(channel_id)
+                if wait > 0:
+                    metrics.inc("ratelimit_waits_total", source="rename")
+                    await asyncio.sleep(wait)
+                    continue
+                name = self.pending.pop(channel_id)
+                channel = self.bot.get_channel(channel_id)
+                if channel is None:
+                    break
+                if channel.name == name:
+                    continue
+                try:
+                    await channel.edit(name=name)
+                except discord.NotFound:
+                    break
+                except discord.HTTPException as e:
+                    print(f"채널 이름 변경 중 오류: {e}")
+                self.record(channel_id)
+        finally:
+            if self.workers.get(channel_id) is asyncio.current_task():
+                del self.workers[channel_id]
+                self.pending.pop(channel_id, None)
+
+class RateWindow:
+    """키(서버, 채널 등)별로 window초 안에 limit회까지만 호출을 통과시킵니다."""
+    def __init__(self, limit: int, window: float, source: str):
+        self.limit = limit
+        self.window = window
+        self.source = source
+        self.history: Dict[Hashable, collections.deque] = {}
+    
+    async def acquire(self, key: Hashable):
+        while True:
+            recent = self.history.setdefault(key, collections.deque())
+            now = time.monotonic()
+            while recent and now - recent[0] >= self.window:
+                recent.popleft()
+            if len(recent) < self.limit:
+                recent.append(now)
+                return
+            metrics.inc("ratelimit_waits_total", source=self.source)
+            await asyncio.sleep(self.window - (now - recent[0]))
+
+# 현재 작업이 보내는 REST 요청의 우선순위 (REST_PRIORITIES의 키)
+rest_priority: contextvars.ContextVar[str] = contextvars.ContextVar("rest_priority", default="default")
+
+@contextlib.contextmanager
+def rest_priority_scope(priority: str):
+    """블록 안에서 보내는 REST 요청의 우선순위를 바꿉니다."""
+    token = rest_priority.set(priority)
+    try:
+        yield
+    finally:
+        rest_priority.reset(token)
+
+class RequestScheduler:
+    """봇이 보내는 REST 요청을 우선순위 순서로 내보냅니다.
+    
+    동시 요청 수와 이 프로세스 몫의 초당 요청 수를 제한하고, 경로(버킷)마다 한 번에 하나씩만 보냅니다.
+    라이브러리가 버킷을 잠가 둔 동안(남은 횟수 소진)과 429 응답 후 대기 시간 동안은 그 경로의 요청을 보내지 않습니다.
+    429를 받아 라이브러리 안에서 대기 중인 요청은 동시 요청 자리를 내놓으므로 다른 경로를 막지 않고,
+    백그라운드 요청은 REST_RESERVED_SLOTS개의 자리를 남겨 둡니다.
+    """
+    def __init__(self, concurrency: int = REST_CONCURRENCY, rate: int = REST_GLOBAL_RATE,
+                 bucket_locks: Optional[Any] = None):
+        self.concurrency = concurrency
+        self.rate = rate
+        # discord.py HTTPClient가 버킷별로 잡는 잠금 (남은 횟수가 0이면 초기화 시각까지 풀리지 않음)
+        self.bucket_locks = bucket_locks if bucket_locks is not None else {}
+        self.active = 0
+        self.sent: collections.deque = collections.deque()
+        # 요청이 진행 중인 버킷, 그중 동시 요청 자리를 차지하고 있는 버킷
+        self.busy: Set[str] = set()
+        self.holding: Set[str] = set()
+        self.blocked: Dict[Optional[str], float] = {}
+        self.waiting: List[Tuple[int, int, str, asyncio.Future]] = []
+        self.sequence = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+    
+    def block(self, bucket: Optional[str], delay: float):
+        """429 응답을 받은 경로를 delay초 동안 막습니다. bucket이 None이면 모든 경로를 막습니다.
+        
+        그 경로에서 진행 중인 요청은 라이브러리 안에서 delay초를 기다리므로 동시 요청 자리를 돌려받습니다.
+        """
+        until = time.monotonic() + delay
+        self.blocked[bucket] = max(self.blocked.get(bucket, 0.0), until)
+        metrics.set("rest_buckets_blocked", len(self.blocked))
+        parked = set(self.holding) if bucket is None else self.holding & {bucket}
+        if parked:
+            self.holding -= parked
+            self.active -= len(parked)
+            self.dispatch()
+    
+    def bucket_ready(self, bucket: str, now: float) -> bool:
+        if bucket in self.busy:
+            return False
+        if self.blocked.get(bucket, 0.0) > now:
+            return False
+        lock = self.bucket_locks.get(bucket)
+        return lock is None or not lock.locked()
+    
+    def record_depth(self):
+        depth = collections.Counter(priority for priority, _, _, future in self.waiting if not future.done())
+        for name, priority in REST_PRIORITIES.items():
+            metrics.set("rest_queue_depth", depth.get(priority, 0), priority=name)
+    
+    def dispatch(self):
+        """보낼 수 있는 요청을 우선순위 순서로 깨웁니다."""
+        now = time.monotonic()
+        while self.sent and now - self.sent[0] >= 1.0:
+            self.sent.popleft()
+        self.blocked = {bucket: until for bucket, until in self.blocked.items() if until > now}
+        metrics.set("rest_buckets_blocked", len(self.blocked))
+        
+        skipped = []
+        if None not in self.blocked:
+            while self.waiting and self.active < self.concurrency and len(self.sent) < self.rate:
+                level, _, bucket, future = self.waiting[0]
+                # 백그라운드 요청은 사용자 요청을 위한 자리를 남겨 둠 (대기열은 우선순위 순이므로 뒤도 모두 백그라운드)
+                if level >= REST_PRIORITIES["background"] and self.active >= self.concurrency - REST_RESERVED_SLOTS:
+                    break
+                item = heapq.heappop(self.waiting)
+                if future.done():
+                    continue
+                if not self.bucket_ready(bucket, now):
+                    skipped.append(item)
+                    continue
+                self.active += 1
+                self.busy.add(bucket)
+                self.holding.add(bucket)
+                self.sent.append(now)
+                future.set_result(None)
+        for item in skipped:
+            heapq.heappush(self.waiting, item)
+        self.record_depth()
+        
+        # 막힌 경로나 초당 제한 때문에 남은 요청은 잠시 후 다시 확인
+        if self.waiting and self.active < self.concurrency and self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(REST_POLL_INTERVAL, self.wake)
+    
+    def wake(self):
+        self.timer = None
+        self.dispatch()
+    
+    def release(self, bucket: str):
+        if bucket in self.holding:
+            self.holding.discard(bucket)
+            self.active -= 1
+        self.busy.discard(bucket)
+        self.dispatch()
+    
+    async def run(self, bucket: str, priority: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """차례가 오면 call()을 실행합니다."""
+        level = REST_PRIORITIES.get(priority, REST_PRIORITIES["default"])
+        future = asyncio.get_running_loop().create_future()
+        self.sequence += 1
+        heapq.heappush(self.waiting, (level, self.sequence, bucket, future))
+        start = time.perf_counter()
+        self.dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # 자리를 받은 직후 취소되었으면 자리를 돌려줌
+            if future.done() and not future.cancelled():
+                self.release(bucket)
+            else:
+                self.record_depth()
+            raise
+        metrics.observe("rest_queue_wait_seconds", time.perf_counter() - start, priority=priority)
+        try:
+            return await call()
+        finally:
+            self.release(bucket)
+
+# 임베드 설정 키 (임베드설정 명령어의 선택지 -> 설정 키)
+EMBED_SETTING_KEYS = {
+    "티켓 패널": "ticket_panel_embed",
+    "티켓 생성": "ticket_created_embed",
+    "티켓 닫힘": "ticket_closed_embed",
+}
+
+# 기본 임베드
+DEFAULT_PANEL_EMBED = {
+    "title": "🎫 티켓 시스템",
+    "description": "아래 버튼을 클릭하여 새로운 티켓을 생성하세요.",
+    "color": 0x3498db,
+    "footer": "문의사항이 있으시면 티켓을 생성해주세요."
+}
+DEFAULT_CREATED_EMBED = {
+    "title": "🎫 새로운 티켓",
+    "description": "티켓이 생성되었습니다.\n담당자가 곧 응답할 것입니다.",
+    "color": 0x3498db
+}
+
+# 티켓 채널 권한
+HIDDEN_OVERWRITE = discord.PermissionOverwrite(read_messages=False)
+MEMBER_OVERWRITE = discord.PermissionOverwrite(read_messages=True, send_messages=True)
+
+def build_embed(embed_settings: dict, defaults: dict) -> discord.Embed:
+    """임베드 설정으로 임베드를 생성합니다."""
+    embed = discord.Embed(
+        title=embed_settings.get("title", defaults.get("title")),
+        description=embed_settings.get("description", defaults.get("description")),
+        color=embed_settings.get("color", defaults.get("color"))
+    )
+    if embed_settings.get("footer"):
+        embed.set_footer(text=embed_settings.get("footer"))
+    return embed
+
+# 서버별 설정 객체
+class GuildConfig:
+    """서버 설정을 미리 해석해 둔 객체입니다. 임베드, 권한 맵, 멘션 문자열을 한 번만 만듭니다."""
+    __slots__ = ("guild_id", "category_ids", "ticket_mode", "thread_channel_id", "log_channel_id", "max_tickets", "ticket_types",
+                 "support_role_ids", "overwrites", "support_mentions", "panel_embed", "created_embed",
+                 "_panel_view")
+    
+    def __init__(self, guild: discord.Guild, settings: dict):
+        self.guild_id = guild.id
+        self.category_ids = ticket_category_ids(settings)
+        # "channel": 카테고리 안 텍스트 채널, "thread": 지원 채널 아래 비공개 스레드
+        self.ticket_mode = settings.get("ticket_mode", "channel")
+        self.thread_channel_id = settings.get("thread_channel_id")
+        self.log_channel_id = settings.get("log_channel_id")
+        self.max_tickets = settings.get("max_tickets_per_user", 3)
+        self.ticket_types = settings.get("ticket_types", [])
+        self.support_role_ids = settings.get("support_role_ids", [])
+        
+        # 기본 권한 맵 (티켓마다 개설자만 추가)
+        self.overwrites = {guild.default_role: HIDDEN_OVERWRITE}
+        for role_id in self.support_role_ids:
+            role = guild.get_role(role_id)
+            if role:
+                self.overwrites[role] = MEMBER_OVERWRITE
+        self.support_mentions = ", ".join(f"<@&{role_id}>" for role_id in self.support_role_ids)
+        
+        self.panel_embed = build_embed(self.embed_settings(settings, "티켓 패널", DEFAULT_PANEL_EMBED), DEFAULT_PANEL_EMBED)
+        self.created_embed = build_embed(self.embed_settings(settings, "티켓 생성", DEFAULT_CREATED_EMBED), DEFAULT_CREATED_EMBED)
+        self._panel_view = None
+    
+    @staticmethod
+    def embed_settings(settings: dict, embed_type: str, defaults: dict) -> dict:
+        # 이전 버전은 "<임베드 유형>_embed" 키에 저장했음
+        return settings.get(EMBED_SETTING_KEYS[embed_type]) or settings.get(f"{embed_type}_embed") or defaults
+    
+    def ticket_overwrites(self, member: discord.Member) -> dict:
+        """개설자를 포함한 티켓 채널 권한 맵을 반환합니다."""
+        overwrites = dict(self.overwrites)
+        overwrites[member] = MEMBER_OVERWRITE
+        return overwrites
+    
+    def panel_view(self, bot: "TicketBot") -> discord.ui.View:
+        """티켓 패널 뷰를 한 번만 만들어 재사용합니다."""
+        if self._panel_view is None:
+            self._panel_view = TicketPanelView(bot, self.ticket_types)
+        return self._panel_view
+
+# 키별 단일 실행
+class SingleFlight:
+    """같은 키로 동시에 들어온 작업을 한 번만 실행하고, 나중에 온 호출은 그 결과를 함께 받습니다."""
+    def __init__(self):
+        self.calls: Dict[Hashable, asyncio.Future] = {}
+    
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self.calls
+    
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable]) -> Tuple[Any, bool]:
+        """(결과, 다른 호출의 결과를 공유했는지 여부)를 반환합니다. 실패한 작업의 결과는 None으로 공유됩니다."""
+        future = self.calls.get(key)
+        if future is not None:
+            return await asyncio.shield(future), True
+        future = asyncio.get_running_loop().create_future()
+        self.calls[key] = future
+        try:
+            result = await factory()
+        except BaseException:
+            future.set_result(None)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self.calls[key]
+
+# 멤버 조회
+class MemberCache:
+    """멤버를 게이트웨이 캐시에서 먼저 찾고, 없으면 REST로 조회한 결과(없는 멤버 포함)를 잠시 기억합니다."""
+    def __init__(self, size: int = MEMBER_CACHE_SIZE, ttl: float = MEMBER_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        # (서버 ID, 사용자 ID) -> (만료 시각, 멤버 또는 None)
+        self.entries: "collections.OrderedDict[Tuple[int, int], Tuple[float, Optional[discord.Member]]]" = collections.OrderedDict()
+    
+    def get(self, guild: discord.Guild, user_id: int) -> Tuple[bool, Optional[discord.Member]]:
+        """(찾았는지 여부, 멤버)를 반환합니다. 없는 멤버로 기억된 경우 (True, None)입니다."""
+        member = guild.get_member(user_id)
+        if member is not None:
+            return True, member
+        key = (guild.id, user_id)
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] < time.monotonic():
+            del self.entries[key]
+            return False, None
+        self.entries.move_to_end(key)
+        return True, entry[1]
+    
+    def put(self, guild_id: int, user_id: int, member: Optional[discord.Member]):
+        self.entries[(guild_id, user_id)] = (time.monotonic() + self.ttl, member)
+        self.entries.move_to_end((guild_id, user_id))
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+    
+    def discard(self, guild_id: int, user_id: int):
+        self.entries.pop((guild_id, user_id), None)
+    
+    async def resolve(self, guild: discord.Guild, user_id: int) -> Optional[discord.Member]:
+        found, member = self.get(guild, user_id)
+        if found:
+            metrics.inc("member_cache_total", result="hit")
+            return member
+        metrics.inc("member_cache_total", result="miss")
+        try:
+            member = await guild.fetch_member(user_id)
+        except discord.NotFound:
+            member = None
+        self.put(guild.id, user_id, member)
+        return member
+    
+    async def resolve_many(self, guild: discord.Guild, user_ids: List[int]) -> Dict[int, Optional[discord.Member]]:
+        """여러 사용자를 한 번에 조회합니다. 캐시에 없는 사용자만 REST로 조회하며, 동시에 MEMBER_FETCH_CONCURRENCY개까지만 보냅니다."""
+        semaphore = asyncio.Semaphore(MEMBER_FETCH_CONCURRENCY)
+        
+        async def resolve(user_id: int) -> Optional[discord.Member]:
+            async with semaphore:
+                return await self.resolve(guild, user_id)
+        
+        members = await asyncio.gather(*(resolve(user_id) for user_id in user_ids))
+        return dict(zip(user_ids, members))
+
+def parse_user_ids(text: str) -> List[int]:
+    """멘션(<@123>, <@!123>)이나 숫자 ID 목록에서 사용자 ID를 순서대로 중복 없이 뽑습니다."""
+    return list(dict.fromkeys(int(match) for match in re.findall(r"\d{15,20}", text)))
+
+# 일괄 종료
+class CloseBatch:
+    """일괄 종료 한 번의 진행 상황입니다."""
+    __slots__ = ("total", "done", "failed", "finished")
+    
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.finished = asyncio.Event()
+        if not total:
+            self.finished.set()
+    
+    def complete(self, ok: bool):
+        if ok:
+            self.done += 1
+        else:
+            self.failed += 1
+        if self.done + self.failed >= self.total:
+            self.finished.set()
+    
+    def progress(self) -> str:
+        text = f"{self.done + self.failed}/{self.total}개 처리"
+        if self.failed:
+            text += f" (실패 {self.failed}개)"
+        return text
+
+class BulkCloser:
+    """여러 티켓의 기록 저장, 로그, 채널 삭제를 제한된 수의 작업자로 처리합니다. 작업은 저장소에 남아 재시작 후 이어집니다."""
+    def __init__(self, bot: "TicketBot", workers: int = CLOSE_WORKERS):
+        self.bot = bot
+        self.worker_count = workers
+        self.store: Optional[CloseJobStore] = None
+        self.queue: asyncio.Queue = asyncio.Queue()
+        # 대기 중이거나 처리 중인 채널 ID -> 속한 일괄 작업
+        self.jobs: Dict[int, Optional[CloseBatch]] = {}
+        # 봇이 나간 서버: 남은 작업을 다시 시도하지 않고 버림
+        self.removed_guilds: Set[int] = set()
+        # 채널 ID -> 다시 시도한 횟수
+        self.retries: Dict[int, int] = {}
+        self.workers: List[asyncio.Task] = []
+        self.deletes = RateWindow(CHANNEL_DELETE_LIMIT, CHANNEL_DELETE_WINDOW, "channel_delete")
+    
+    async def start(self):
+        """작업 저장소를 열고 재시작 전에 끝나지 않은 작업을 다시 대기열에 넣습니다."""
+        try:
+            self.store = await asyncio.to_thread(CloseJobStore)
+            pending = await asyncio.to_thread(self.store.load)
+        except Exception as e:
+            print(f"일괄 종료 작업 로드 중 오류 발생: {e}")
+            pending = []
+        if pending:
+            batch = CloseBatch(len(pending))
+            for job in pending:
+                self.jobs[job[0]] = batch
+                self.queue.put_nowait(job)
+            self.bot.loop.create_task(self.report_resumed(batch))
+        for _ in range(self.worker_count):
+            self.workers.append(self.bot.loop.create_task(self._worker()))
+    
+    async def report_resumed(self, batch: CloseBatch):
+        print(f"재시작 전 일괄 종료 작업 {batch.total}개를 이어서 처리합니다.")
+        await batch.finished.wait()
+        print(f"이어서 처리한 일괄 종료 작업 완료: {batch.progress()}")
+    
+    async def submit(self, guild_id: int, channel_ids: List[int], closed_by: Optional[int], reason: str) -> CloseBatch:
+        """티켓들을 닫는 작업을 저장하고 대기열에 넣습니다. 이미 대기 중인 티켓은 건너뜁니다."""
+        channel_ids = [channel_id for channel_id in channel_ids if channel_id not in self.jobs]
+        batch = CloseBatch(len(channel_ids))
+        if not channel_ids:
+            return batch
+        jobs = [(channel_id, guild_id, closed_by, reason) for channel_id in channel_ids]
+        if self.store is not None:
+            await asyncio.to_thread(self.store.add, jobs)
+        for job in jobs:
+            self.jobs[job[0]] = batch
+            self.queue.put_nowait((*job, "pending"))
+        return batch
+    
+    async def _worker(self):
+        rest_priority.set("background")
+        await self.bot.wait_until_ready()
+        while not self.bot.is_closed():
+            job = await self.queue.get()
+            channel_id = job[0]
+            ok = False
+            try:
+                ok = await self.close_one(*job)
+            except Exception as e:
+                print(f"티켓 {channel_id} 일괄 종료 중 오류 발생: {e}")
+            finally:
+                if ok is None and self.retries.get(channel_id, 0) < CLOSE_RETRY_LIMIT:
+                    # 맡은 서버가 잠시 사용할 수 없는 상태면 작업을 버리지 않고 나중에 다시 대기열에 넣음
+                    self.retries[channel_id] = self.retries.get(channel_id, 0) + 1
+                    self.bot.loop.call_later(CLOSE_RETRY_DELAY, self.queue.put_nowait, job)
+                else:
+                    # 끝난 작업이거나, 횟수를 넘겨 저장소에 남긴 채 재시작 후 다시 시도할 작업
+                    self.retries.pop(channel_id, None)
+                    batch = self.jobs.pop(channel_id, None)
+                    if batch is not None:
+                        batch.complete(bool(ok))
+                self.queue.task_done()
+    
+    async def close_one(self, channel_id: int, guild_id: int, closed_by: Optional[int], reason: str, stage: str) -> Optional[bool]:
+        """티켓 하나를 닫습니다. 나중에 다시 시도해야 하면 None을 반환합니다."""
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            if self.bot.owns_guild(guild_id) and guild_id not in self.removed_guilds:
+                return None
+            # 다른 샤드 그룹의 서버 작업은 그 프로세스가 처리
+            return False
+        channel = guild.get_channel_or_thread(channel_id)
+        if channel is not None:
+            if stage == "pending":
+                await self.bot.finish_ticket(channel, closed_by, reason)
+                if self.store is not None:
+                    await asyncio.to_thread(self.store.set_stage, channel_id, "archived")
+            await self.deletes.acquire(guild_id)
+            try:
+                await channel.delete(reason=reason)
+            except discord.NotFound:
+                pass
+        else:
+            record = self.bot.close_record(channel_id, closed_by)
+            if record:
+                await self.bot.save_tickets(record)
+        if self.store is not None:
+            await asyncio.to_thread(self.store.remove, channel_id)
+        return True
+    
+    async def purge_guild(self, guild_id: int):
+        """봇이 나간 서버의 남은 종료 작업을 저장소에서 지우고, 대기열에 남은 작업은 다시 시도하지 않게 합니다."""
+        self.removed_guilds.add(guild_id)
+        if self.store is not None:
+            await asyncio.to_thread(self.store.remove_guild, guild_id)
+    
+    def close(self):
+        for worker in self.workers:
+            worker.cancel()
+        self.workers.clear()
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+# 예약 작업
+class Scheduler:
+    """만기 시각 힙 하나로 모든 예약 작업(채널 삭제, 유휴 티켓 확인 등)을 실행하는 단일 작업입니다."""
+    def __init__(self, bot: "TicketBot"):
+        self.bot = bot
+        self.store: Optional[ActionStore] = None
+        # (만기 시각, 순번, 작업)
+        self.heap: List[Tuple[float, int, ScheduledAction]] = []
+        self.seq = 0
+        # 작업 종류 -> 같은 종류의 만기된 작업 목록을 받는 처리 함수
+        self.handlers: Dict[str, Callable[[List[ScheduledAction]], Awaitable]] = {}
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+    
+    def register(self, kind: str, handler: Callable[[List[ScheduledAction]], Awaitable]):
+        self.handlers[kind] = handler
+    
+    async def start(self):
+        """저장된 예약 작업을 복구하고 실행을 시작합니다. 재시작 중에 만기된 작업은 준비 후 바로 실행됩니다."""
+        try:
+            self.store = await asyncio.to_thread(ActionStore)
+            actions = await asyncio.to_thread(self.store.load)
+        except Exception as e:
+            print(f"예약 작업 로드 중 오류 발생: {e}")
+            actions = []
+        for action in actions:
+            self.push(action)
+        if actions:
+            print(f"예약 작업 {len(actions)}개를 복구했습니다.")
+        self.task = self.bot.loop.create_task(self._run())
+    
+    def push(self, action: ScheduledAction):
+        self.seq += 1
+        heapq.heappush(self.heap, (action.due, self.seq, action))
+        metrics.set("scheduled_actions", len(self.heap))
+        self.wakeup.set()
+    
+    async def schedule(self, delay: float, kind: str, guild_id: Optional[int] = None, channel_id: Optional[int] = None,
+                       payload: Optional[dict] = None, persist: bool = True) -> ScheduledAction:
+        """delay초 뒤에 실행할 작업을 예약합니다. persist가 참이면 재시작 후에도 실행됩니다."""
+        action = ScheduledAction(None, datetime.datetime.now().timestamp() + delay, kind, guild_id, channel_id, payload)
+        if persist and self.store is not None:
+            action.action_id = await asyncio.to_thread(self.store.add, action)
+        self.push(action)
+        return action
+    
+    def take_due(self) -> List[ScheduledAction]:
+        now = datetime.datetime.now().timestamp() + SCHEDULER_BATCH_WINDOW
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap)[2])
+        metrics.set("scheduled_actions", len(self.heap))
+        return due
+    
+    async def _run(self):
+        rest_priority.set("background")
+        await self.bot.wait_until_ready()
+        while not self.bot.is_closed():
+            self.wakeup.clear()
+            if not self.heap:
+                await self.wakeup.wait()
+                continue
+            wait = self.heap[0][0] - datetime.datetime.now().timestamp()
+            if wait > SCHEDULER_BATCH_WINDOW:
+                # 더 이른 작업이 예약되면 깨어나 다시 계산
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self.wakeup.wait(), wait)
+                continue
+            await self.run_due(self.take_due())
+    
+    async def run_due(self, actions: List[ScheduledAction]):
+        """만기된 작업을 종류별로 묶어 처리하고, 처리한 작업을 저장소에서 한 번에 지웁니다."""
+        now = datetime.datetime.now().timestamp()
+        by_kind: Dict[str, List[ScheduledAction]] = {}
+        unavailable = []
+        for action in actions:
+            if action.guild_id is not None and self.bot.get_guild(action.guild_id) is None:
+                # 다른 샤드 그룹의 서버 작업은 그 프로세스가 처리하도록 저장소에만 남기고,
+                # 맡은 서버가 잠시 사용할 수 없는 상태면 나중에 다시 시도
+                if self.bot.owns_guild(action.guild_id):
+                    unavailable.append(action)
+                continue
+            metrics.observe("scheduler_lag_seconds", max(now - action.due, 0), kind=action.kind)
+            by_kind.setdefault(action.kind, []).append(action)
+        # 끝내 돌아오지 않는 서버(꺼져 있는 동안 봇이 나간 서버 등)의 작업은 횟수를 넘기면 지움
+        done = [action.action_id for action in self.retry_failed(unavailable, now) if action.action_id is not None]
+        for kind, batch in by_kind.items():
+            handler = self.handlers.get(kind)
+            if handler is None:
+                print(f"알 수 없는 예약 작업 종류: {kind}")
+            else:
+                try:
+                    await handler(batch)
+                except Exception as e:
+                    print(f"예약 작업({kind}) {len(batch)}개 처리 중 오류 발생: {e}")
+                    batch = self.retry_failed(batch, now)
+            done.extend(action.action_id for action in batch if action.action_id is not None)
+        if done and self.store is not None:
+            try:
+                await asyncio.to_thread(self.store.remove, done)
+            except Exception as e:
+                print(f"예약 작업 정리 중 오류 발생: {e}")
+    
+    def retry_failed(self, batch: List[ScheduledAction], now: float) -> List[ScheduledAction]:
+        """실패했거나 서버를 쓸 수 없던 작업을 점점 늘어나는 간격으로 다시 예약하고, 횟수를 넘긴 작업만 돌려줘 지우게 합니다."""
+        dropped = []
+        for action in batch:
+            if action.attempts >= SCHEDULER_RETRY_LIMIT:
+                dropped.append(action)
+                continue
+            action.due = now + min(SCHEDULER_RETRY_DELAY * 2 ** action.attempts, SCHEDULER_MAX_BACKOFF)
+            action.attempts += 1
+            self.push(action)
+        if dropped:
+            print(f"예약 작업 {len(dropped)}개가 {SCHEDULER_RETRY_LIMIT}번 재시도 후에도 처리되지 않아 버립니다.")
+        return dropped
+    
+    async def purge_guild(self, guild_id: int):
+        """봇이 나간 서버의 예약 작업을 힙과 저장소에서 지웁니다."""
+        self.heap = [entry for entry in self.heap if entry[2].guild_id != guild_id]
+        heapq.heapify(self.heap)
+        metrics.set("scheduled_actions", len(self.heap))
+        if self.store is not None:
+            await asyncio.to_thread(self.store.remove_guild, guild_id)
+    
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+# 카테고리 사용량
+class CategoryTracker:
+    """티켓 카테고리별 채널 수를 채널 이벤트로 추적해, 새 티켓을 가장 여유 있는 카테고리에 넣습니다."""
+    def __init__(self, limit: int = CATEGORY_CHANNEL_LIMIT):
+        self.limit = limit
+        # 카테고리 ID -> 속한 채널 ID
+        self.channels: Dict[int, Set[int]] = {}
+        # 카테고리 ID -> 만드는 중인 채널 수 (고른 뒤 생성 이벤트가 오기 전까지)
+        self.pending: Dict[int, int] = {}
+    
+    def track(self, category):
+        self.channels[category.id] = {channel.id for channel in category.channels}
+        self.pending.setdefault(category.id, 0)
+    
+    def untrack(self, category_id: int):
+        self.channels.pop(category_id, None)
+        self.pending.pop(category_id, None)
+    
+    def occupancy(self, category_id: int) -> int:
+        return len(self.channels.get(category_id, ())) + self.pending.get(category_id, 0)
+    
+    def add(self, channel):
+        members = self.channels.get(getattr(channel, "category_id", None))
+        if members is not None:
+            members.add(channel.id)
+    
+    def remove(self, channel):
+        members = self.channels.get(getattr(channel, "category_id", None))
+        if members is not None:
+            members.discard(channel.id)
+    
+    def pick(self, guild: discord.Guild, category_ids: List[int]):
+        """자리가 남은 카테고리 중 가장 여유 있는 곳을 골라 한 자리를 예약합니다. 모두 가득 차면 None입니다."""
+        best, best_count = None, self.limit
+        for category_id in category_ids:
+            if category_id not in self.channels:
+                category = guild.get_channel(category_id)
+                if category is None:
+                    continue
+                self.track(category)
+            count = self.occupancy(category_id)
+            if count < best_count:
+                best, best_count = category_id, count
+        if best is None:
+            return None
+        self.pending[best] += 1
+        return guild.get_channel(best)
+    
+    def settle(self, category_id: int, channel=None):
+        """pick으로 예약한 자리를 채널 생성 결과로 확정하거나 돌려놓습니다."""
+        if category_id in self.pending:
+            self.pending[category_id] = max(self.pending[category_id] - 1, 0)
+        if channel is not None:
+            self.add(channel)
+
+# 로그 묶음 전송
+def attachment_sizes(paths: List[str]) -> List[Tuple[str, int]]:
+    """첨부할 파일의 (경로, 크기) 목록입니다. 디스크를 읽으므로 이벤트 루프 밖에서 호출합니다."""
+    return [(path, os.path.getsize(path)) for path in paths if os.path.exists(path)]
+
+def fit_attachments(embed: discord.Embed, attachments: List[Tuple[str, int]], size_limit: int) -> List[Tuple[str, int]]:
+    """메시지 하나의 파일 수와 업로드 크기 제한 안에 들어가는 파일만 고릅니다. 빠진 파일이 있으면 임베드에 알립니다."""
+    fitting, total = [], 0
+    for path, length in attachments:
+        if len(fitting) < LOG_DIGEST_FILES and total + length <= size_limit:
+            fitting.append((path, length))
+            total += length
+    if len(fitting) < len(attachments):
+        embed.add_field(name="트랜스크립트", value="파일이 너무 커서 일부를 첨부하지 못했습니다.", inline=False)
+    return fitting
+
+class LogBuffer:
+    """로그 채널별로 임베드를 모아 메시지 하나(임베드 최대 10개)로 보냅니다. 개수가 차거나 대기 시간이 지나면 보냅니다."""
+    def __init__(self, bot: "TicketBot", delay: float = LOG_DIGEST_DELAY):
+        self.bot = bot
+        self.delay = delay
+        # 로그 채널 ID -> [(임베드, [(파일 경로, 크기)])]
+        self.entries: Dict[int, List[Tuple[discord.Embed, List[Tuple[str, int]]]]] = {}
+        self.channels: Dict[int, discord.TextChannel] = {}
+        self.wakeups: Dict[int, asyncio.Event] = {}
+        self.workers: Dict[int, asyncio.Task] = {}
+    
+    async def add(self, channel: discord.TextChannel, embed: discord.Embed, paths: List[str] = ()):
+        attachments = await asyncio.to_thread(attachment_sizes, paths)
+        entries = self.entries.setdefault(channel.id, [])
+        entries.append((embed, attachments))
+        self.channels[channel.id] = channel
+        metrics.set("log_buffer_entries", sum(len(pending) for pending in self.entries.values()))
+        if channel.id not in self.workers:
+            self.wakeups[channel.id] = asyncio.Event()
+            self.workers[channel.id] = self.bot.loop.create_task(self._worker(channel.id))
+        elif len(entries) >= LOG_DIGEST_SIZE:
+            self.wakeups[channel.id].set()
+    
+    async def _worker(self, channel_id: int):
+        rest_priority.set("background")
+        try:
+            while self.entries.get(channel_id):
+                wakeup = self.wakeups[channel_id]
+                if len(self.entries[channel_id]) < LOG_DIGEST_SIZE:
+                    with contextlib.suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(wakeup.wait(), self.delay)
+                wakeup.clear()
+                await self.flush(channel_id)
+        finally:
+            self.workers.pop(channel_id, None)
+            self.wakeups.pop(channel_id, None)
+    
+    @staticmethod
+    def batches(entries: list, size_limit: int):
+        """임베드 수, 파일 수, 업로드 크기 제한에 맞춰 메시지 단위로 나눕니다."""
+        batch, files, size = [], 0, 0
+        for embed, attachments in entries:
+            # 항목 하나만으로 제한을 넘지 않도록 먼저 줄여 둠
+            fitting = fit_attachments(embed, attachments, size_limit)
+            length = sum(length for _, length in fitting)
+            if batch and (len(batch) >= LOG_DIGEST_SIZE or files + len(fitting) > LOG_DIGEST_FILES or size + length > size_limit):
+                yield batch
+                batch, files, size = [], 0, 0
+            batch.append((embed, fitting))
+            files += len(fitting)
+            size += length
+        if batch:
+            yield batch
+    
+    async def flush(self, channel_id: int):
+        """모인 로그를 가능한 적은 메시지로 보냅니다."""
+        entries = self.entries.pop(channel_id, [])
+        channel = self.channels.pop(channel_id, None)
+        metrics.set("log_buffer_entries", sum(len(pending) for pending in self.entries.values()))
+        if not entries or channel is None:
+            return
+        for batch in self.batches(entries, channel.guild.filesize_limit):
+            async def send(batch=batch):
+                # 재시도할 때마다 파일을 새로 열어야 함
+                await self.bot.log_sends.acquire(channel.id)
+                await channel.send(
+                    embeds=[embed for embed, _ in batch],
+                    files=[discord.File(path, filename=os.path.basename(path)) for _, attachments in batch for path, _ in attachments]
+                )
+            send.__name__ = "로그 묶음 전송"
+            metrics.observe("log_digest_size", len(batch))
+            try:
+                await self.bot.run_step("로그", send)
+            except Exception as e:
+                print(f"로그 묶음 전송 중 오류 발생 (임베드 {len(batch)}개): {e}")
+    
+    async def flush_all(self):
+        for channel_id in list(self.entries):
+            await self.flush(channel_id)
+
+# 대기 채널 풀
+class ChannelPool:
+    """서버별로 숨겨진 티켓 채널을 미리 만들어 두고, 티켓 생성 시 하나씩 꺼내 씁니다."""
+    def __init__(self, bot: "TicketBot"):
+        self.bot = bot
+        # 서버 ID -> 대기 채널 ID 목록
+        self.channels: Dict[int, collections.deque] = {}
+        self.refill_tasks: Dict[int, asyncio.Task] = {}
+        # 서버 ID -> 풀이 목표 크기 아래로 내려간 시각
+        self.refill_started: Dict[int, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.last_refill_lag = 0.0
+        self.max_refill_lag = 0.0
+    
+    def target_size(self, guild_id: int) -> int:
+        settings = self.bot.ticket_settings.get(str(guild_id), {})
+        return settings.get("channel_pool_size", 0)
+    
+    def size(self, guild_id: int) -> int:
+        return len(self.channels.get(guild_id, ()))
+    
+    def load_guild(self, guild: discord.Guild, categories: list):
+        """티켓 카테고리들에 남아 있는 대기 채널을 풀에 등록합니다."""
+        self.channels[guild.id] = collections.deque(
+            channel.id for category in categories for channel in category.channels
+            if isinstance(channel, discord.TextChannel) and channel.topic == POOL_TOPIC
+        )
+        self.schedule_refill(guild)
+    
+    def claim(self, guild: discord.Guild) -> Optional[discord.TextChannel]:
+        """대기 채널 하나를 꺼냅니다. 풀이 비어 있으면 None을 반환합니다."""
+        pool = self.channels.get(guild.id)
+        channel = None
+        while pool and channel is None:
+            channel = guild.get_channel(pool.popleft())
+        if self.target_size(guild.id) <= 0:
+            return channel
+        if channel is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        self.schedule_refill(guild)
+        return channel
+    
+    def release(self, guild_id: int, channel_id: int):
+        """꺼냈지만 쓰지 못한 대기 채널을 풀 맨 앞에 돌려놓습니다."""
+        self.channels.setdefault(guild_id, collections.deque()).appendleft(channel_id)
+    
+    def discard(self, guild_id: int, channel_id: int):
+        """삭제된 대기 채널을 풀에서 뺍니다."""
+        pool = self.channels.get(guild_id)
+        if pool and channel_id in pool:
+            pool.remove(channel_id)
+    
+    def schedule_refill(self, guild: discord.Guild):
+        """풀이 목표 크기보다 작으면 백그라운드에서 채웁니다."""
+        if self.size(guild.id) >= self.target_size(guild.id):
+            return
+        self.refill_started.setdefault(guild.id, time.monotonic())
+        task = self.refill_tasks.get(guild.id)
+        if task is None or task.done():
+            self.refill_tasks[guild.id] = self.bot.loop.create_task(self._refill(guild))
+    
+    async def _refill(self, guild: discord.Guild):
+        rest_priority.set("background")
+        overwrites = {
+            guild.default_role: discord.PermissionOverwrite(read_messages=False),
+            guild.me: discord.PermissionOverwrite(read_messages=True, send_messages=True)
+        }
+        while self.size(guild.id) < self.target_size(guild.id):
+            # 대기 채널도 카테고리 자리를 차지하므로 가장 여유 있는 카테고리에 만듦
+            settings = self.bot.ticket_settings.get(str(guild.id), {})
+            category = self.bot.category_tracker.pick(guild, ticket_category_ids(settings))
+            if not category:
+                return
+            channel = None
+            try:
+                channel = await category.create_text_channel(POOL_CHANNEL_NAME, overwrites=overwrites, topic=POOL_TOPIC)
+            except discord.HTTPException as e:
+                print(f"대기 채널 생성 중 오류: {e}")
+                return
+            finally:
+                self.bot.category_tracker.settle(category.id, channel)
+            self.channels.setdefault(guild.id, collections.deque()).append(channel.id)
+        started = self.refill_started.pop(guild.id, None)
+        if started is not None:
+            self.last_refill_lag = time.monotonic() - started
+            self.max_refill_lag = max(self.max_refill_lag, self.last_refill_lag)
+    
+    def stats(self) -> Dict[str, float]:
+        """풀 적중률과 보충 지연 통계를 반환합니다."""
+        claims = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / claims if claims else 0.0,
+            "last_refill_lag": self.last_refill_lag,
+            "max_refill_lag": self.max_refill_lag,
+        }
 
 # 봇 클래스 정의
-class TicketBot(commands.Bot):
-    def __init__(self, command_prefix, intents):
-        super().__init__(command_prefix=command_prefix, intents=intents)
-        self.ticket_settings = {}
-        self.active_tickets = {} 
+class TicketBot(commands.AutoShardedBot):
+    def __init__(self, command_prefix, intents, settings_store: Optional[SettingsStore] = None,
+                 shard_count: Optional[int] = None, shard_ids: Optional[List[int]] = None):
+        # 명령어 동기화는 on_connect에서 지문이 바뀐 경우에만 직접 수행
+        super().__init__(command_prefix=command_prefix, intents=intents, shard_count=shard_count, shard_ids=shard_ids,
+                         auto_sync_commands=False)
+        self.ticket_settings = LazySettings(settings_store)
+        self.settings_store = settings_store
+        # 시작 단계별 소요 시간 (초)
+        self.started_at = time.perf_counter()
+        self.startup_timings: Dict[str, float] = {}
+        # 아직 기록되지 않은 서버 ID 목록과 예약된 기록 작업
+        self.dirty_settings: Set[str] = set()
+        self.settings_flush_task: Optional[asyncio.Task] = None
+        self.rename_coalescer = RenameCoalescer(self)
+        self.channel_pool = ChannelPool(self)
+        self.category_tracker = CategoryTracker()
+        # 서버 ID -> 해석된 서버 설정 (설정 저장 시 무효화)
+        self.guild_configs: Dict[int, GuildConfig] = {}
+        # 티켓 버튼 디스패처 (재시작 전에 보낸 패널과 티켓 버튼도 처리, 클래스가 뒤에 정의되어 처음 사용할 때 만듦)
+        self.dispatcher: Optional["TicketDispatcher"] = None
+        self.add_listener(self.route_interaction, "on_interaction")
+        # 시작 작업과 명령어 동기화는 프로세스당 한 번만
+        self.setup_done = False
+        self.commands_synced = False
+        # (서버 ID, 사용자 ID, 티켓 종류)별 티켓 생성 단일 실행
+        self.ticket_creation = SingleFlight()
+        self.member_cache = MemberCache()
+        self.bulk_closer = BulkCloser(self)
+        self.scheduler = Scheduler(self)
+        self.scheduler.register("delete_channel", self.delete_channels)
+        self.scheduler.register("idle_check", self.idle_check)
+        # 로그 채널별 메시지 전송 속도 제한과 묶음 전송 버퍼
+        self.log_sends = RateWindow(MESSAGE_SEND_LIMIT, MESSAGE_SEND_WINDOW, "message_send")
+        self.log_buffer = LogBuffer(self)
+        # 실행 중인 백그라운드 파이프라인 (작업이 GC되지 않도록 참조 유지)
+        self.pipelines: Set[asyncio.Task] = set()
+        # 채널 ID -> 열린 티켓 기록
+        self.active_tickets: Dict[int, TicketRecord] = {}
+        self.ticket_store: Optional[TicketStore] = None
+        self.ticket_stats = TicketStats()
+        self.stats_store: Optional[StatsStore] = None
+        self.stats_flush_task: Optional[asyncio.Task] = None
+        self.transcript_archive: Optional[TranscriptArchive] = None
+        self.metrics_runner = None
+        self.ticket_index = TicketIndex()
+        # 다른 프로세스(샤드 그룹)의 변경 알림
+        self.change_feed: Optional[ChangeFeed] = None
+        self.change_seq = 0
         # 개발자 ID 목록 (여기에 개발자 ID를 추가하세요)
         self.developer_ids = []
         
-    async def setup_hook(self):
-        # 봇이 시작될 때 설정 로드
-        self.load_settings()
+    @contextlib.contextmanager
+    def startup_phase(self, phase: str):
+        """시작 단계 하나의 소요 시간을 기록합니다."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.startup_timings[phase] = elapsed
+            metrics.set("startup_phase_seconds", elapsed, phase=phase)
+    
+    def report_startup(self):
+        total = time.perf_counter() - self.started_at
+        phases = ", ".join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in self.startup_timings.items())
+        print(f"시작 완료 {total:.2f}초 ({phases})")
+    
+    async def login(self, token: str):
+        await super().login(token)
+        # py-cord에는 setup_hook이 없으므로 게이트웨이에 연결하기 전에 여기서 시작 작업을 실행
+        if not self.setup_done:
+            self.setup_done = True
+            await self.startup()
+    
+    async def on_connect(self):
+        # 기본 on_connect는 연결할 때마다 명령어를 동기화하므로 대신 구성이 바뀌었을 때만 동기화
+        # (전역 명령어이므로 0번 샤드를 가진 프로세스만)
+        if self.commands_synced or not (self.shard_ids is None or 0 in self.shard_ids):
+            return
+        self.commands_synced = True
+        with self.startup_phase("command_sync"):
+            try:
+                await self.sync_commands_if_changed()
+            except discord.HTTPException as e:
+                print(f"슬래시 명령어 동기화 중 오류 발생: {e}")
+                self.commands_synced = False
+    
+    async def route_interaction(self, interaction: discord.Interaction):
+        """on_interaction 이벤트를 티켓 버튼 디스패처로 넘깁니다."""
+        if self.dispatcher is None:
+            self.dispatcher = TicketDispatcher(self)
+        await self.dispatcher.dispatch(interaction)
+    
+    async def startup(self):
+        """저장소를 열고 기록을 로드한 뒤 백그라운드 작업을 시작합니다."""
+        # 설정 저장소 열기 (서버 설정은 처음 사용할 때 읽음)
+        with self.startup_phase("settings"):
+            await self.load_settings()
+        
+        # 열린 티켓 기록과 누적 통계를 한 번에 로드
+        with self.startup_phase("tickets"):
+            await self.load_tickets()
+        with self.startup_phase("stats"):
+            await self.load_stats()
+        
+        # 트랜스크립트 보관소 열기 및 보관 기간 정리
+        with self.startup_phase("archive"):
+            await self.open_archive()
+        
+        # 성능 지표 수집 시작
+        with self.startup_phase("metrics"):
+            await self.start_metrics()
+        
+        # 게이트웨이 준비 후 실제 채널과 맞춰 보고 열린 티켓 인덱스 구축
+        self.loop.create_task(self.build_ticket_index())
         
-        # 슬래시 명령어 동기화
+        # 다른 프로세스의 설정/티켓 변경 구독
+        with self.startup_phase("change_feed"):
+            await self.watch_changes()
+        
+        # 재시작 전에 끝나지 않은 일괄 종료 작업과 예약 작업을 복구
+        with self.startup_phase("scheduler"):
+            await self.bulk_closer.start()
+            await self.scheduler.start()
+            # 유휴 티켓 확인은 프로세스마다 돌기 때문에 저장하지 않음
+            await self.scheduler.schedule(IDLE_CHECK_INTERVAL, "idle_check", persist=False)
+    
+    def command_fingerprint(self) -> str:
+        """등록된 슬래시 명령어 구성의 해시를 계산합니다."""
+        schema = sorted(
+            (command.to_dict() for command in self.pending_application_commands),
+            key=lambda command: (command.get("type", 1), command["name"])
+        )
+        payload = json.dumps({"application_id": self.application_id, "commands": schema},
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    async def sync_commands_if_changed(self):
+        """명령어 구성이 마지막 동기화 때와 같으면 동기화를 건너뜁니다."""
+        fingerprint = self.command_fingerprint()
+        
+        def read_fingerprint() -> Optional[str]:
+            if not os.path.exists(COMMAND_FINGERPRINT_PATH):
+                return None
+            with open(COMMAND_FINGERPRINT_PATH, 'r', encoding='utf-8') as f:
+                return f.read().strip()
+        
+        def write_fingerprint():
+            tmp_path = f"{COMMAND_FINGERPRINT_PATH}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(fingerprint)
+            os.replace(tmp_path, COMMAND_FINGERPRINT_PATH)
+        
+        if not FORCE_COMMAND_SYNC and await asyncio.to_thread(read_fingerprint) == fingerprint:
+            print("슬래시 명령어 변경 없음, 동기화 생략")
+            return
         await self.sync_commands()
+        await asyncio.to_thread(write_fingerprint)
         print(f"슬래시 명령어 동기화 완료!")
     
-    def load_settings(self):
-        """설정 파일에서 티켓 설정을 로드합니다."""
+    async def load_tickets(self):
+        """티켓 저장소에서 열린 티켓 기록을 로드합니다."""
         try:
-            if os.path.exists('ticket_settings.json'):
-                with open('ticket_settings.json', 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    if content:
-                        self.ticket_settings = json.loads(content)
+            if self.ticket_store is None:
+                self.ticket_store = await asyncio.to_thread(TicketStore)
+            records = await asyncio.to_thread(self.ticket_store.load_open)
+            # 다른 샤드 그룹의 티켓은 그 프로세스가 관리
+            self.active_tickets = {record.channel_id: record for record in records if self.owns_guild(record.guild_id)}
+        except Exception as e:
+            print(f"티켓 기록 로드 중 오류 발생: {e}")
+    
+    async def finish_ticket(self, channel: discord.TextChannel, closed_by: Optional[int], reason: Optional[str] = None) -> Optional[TicketRecord]:
+        """티켓 기록을 닫고 트랜스크립트를 저장한 뒤 로그 채널에 남깁니다. 채널 삭제는 호출한 쪽에서 합니다."""
+        # 티켓 기록 닫기
+        record = self.close_record(channel.id, closed_by)
+        if record:
+            duration = record.get_duration()
+            await self.save_tickets(record)
+        else:
+            duration = None
+        
+        # 트랜스크립트 저장 (페이지 단위 스트리밍, 보관소에 색인)
+        if record:
+            opener_id, ticket_type, created_at = record.opener_id, record.ticket_type, record.created_at
+        else:
+            _, opener_id, ticket_type = self.ticket_index.get(channel.id) or (None, None, None)
+            created_at = channel.created_at.timestamp()
+        metadata = {
+            "guild_id": channel.guild.id,
+            "channel_name": channel.name,
+            "opener_id": opener_id,
+            "ticket_type": ticket_type,
+            "closed_by": closed_by,
+            "created_at": created_at,
+            "closed_at": datetime.datetime.now().timestamp(),
+        }
+        # 기록 조회는 사용자 응답보다 뒤로 미룸
+        with rest_priority_scope("background"):
+            transcript_paths = await export_transcript(channel, self.transcript_archive, metadata)
+        
+        # 로그 채널에 기록
+        closer = f"<@{closed_by}>" if closed_by else "자동"
+        close_embed = discord.Embed(
+            title="🔒 티켓 닫힘",
+            description=f"**티켓:** {channel.name}\n**닫은 사람:** {closer}",
+            color=discord.Color.red(),
+            timestamp=datetime.datetime.now()
+        )
+        
+        if duration:
+            close_embed.add_field(
+                name="처리 시간",
+                value=str(duration).split('.')[0]
+            )
+        if reason:
+            close_embed.add_field(name="사유", value=reason)
+        
+        await self.send_log(channel.guild, close_embed, transcript_paths)
+        return record
+    
+    async def send_log(self, guild: discord.Guild, embed: discord.Embed, paths: List[str] = ()):
+        """서버 로그 채널에 기록합니다. 설정(log_mode)에 따라 모아서 보내거나(digest) 바로 보냅니다(immediate)."""
+        settings = self.ticket_settings.get(str(guild.id), {})
+        log_channel_id = settings.get("log_channel_id")
+        log_channel = guild.get_channel(log_channel_id) if log_channel_id else None
+        if log_channel is None:
+            return
+        if settings.get("log_mode", "digest") == "digest":
+            await self.log_buffer.add(log_channel, embed, paths)
+            return
+        attachments = fit_attachments(embed, await asyncio.to_thread(attachment_sizes, paths), guild.filesize_limit)
+        await self.log_sends.acquire(log_channel.id)
+        with rest_priority_scope("background"):
+            await log_channel.send(
+                embed=embed,
+                files=[discord.File(path, filename=os.path.basename(path)) for path, _ in attachments]
+            )
+    
+    def idle_tickets(self, guild: discord.Guild, hours: float, ticket_type: Optional[str] = None) -> List[int]:
+        """마지막 메시지(없으면 채널 생성) 이후 hours시간 넘게 활동이 없는 열린 티켓 채널 ID를 반환합니다."""
+        cutoff = discord.utils.utcnow() - datetime.timedelta(hours=hours)
+        idle = []
+        for channel_id, (guild_id, _, channel_type) in self.ticket_index.channels.items():
+            if guild_id != guild.id or (ticket_type and channel_type != ticket_type):
+                continue
+            channel = guild.get_channel_or_thread(channel_id)
+            if channel is None:
+                continue
+            if channel.last_message_id:
+                last_activity = discord.utils.snowflake_time(channel.last_message_id)
+            else:
+                last_activity = channel.created_at
+            if last_activity <= cutoff:
+                idle.append(channel_id)
+        return idle
+    
+    async def idle_check(self, actions: List[ScheduledAction]):
+        """서버별 유휴 시간 설정(idle_close_hours)을 넘긴 티켓을 일괄 종료하고 다음 확인을 예약합니다."""
+        try:
+            for guild in self.guilds:
+                hours = self.ticket_settings.get(str(guild.id), {}).get("idle_close_hours")
+                if not hours:
+                    continue
+                idle = self.idle_tickets(guild, hours)
+                if idle:
+                    batch = await self.bulk_closer.submit(guild.id, idle, None, f"{hours}시간 동안 활동 없음")
+                    if batch.total:
+                        print(f"[{guild.name}] 유휴 티켓 {batch.total}개 자동 종료")
+        finally:
+            await self.scheduler.schedule(IDLE_CHECK_INTERVAL, "idle_check", persist=False)
+    
+    async def delete_channels(self, actions: List[ScheduledAction]):
+        """예약된 티켓 채널 삭제를 서버별 삭제 속도 제한에 맞춰 동시에 처리합니다."""
+        async def delete(action: ScheduledAction):
+            guild = self.get_guild(action.guild_id)
+            channel = guild.get_channel_or_thread(action.channel_id) if guild else None
+            if channel is None:
+                return
+            await self.bulk_closer.deletes.acquire(action.guild_id)
+            try:
+                await channel.delete(reason=action.payload.get("reason"))
+            except discord.NotFound:
+                pass
+            except discord.HTTPException as e:
+                print(f"티켓 채널 삭제 중 오류 발생: {e}")
+        
+        await asyncio.gather(*(delete(action) for action in actions))
+    
+    async def watch_changes(self):
+        """공유 저장소의 변경 기록 구독을 시작합니다. 시작 이전의 변경은 이미 로드되어 있습니다."""
+        if not isinstance(self.settings_store, SQLiteSettingsStore):
+            return
+        try:
+            self.change_feed = await asyncio.to_thread(ChangeFeed)
+            self.change_seq = await asyncio.to_thread(self.change_feed.latest)
+        except Exception as e:
+            print(f"변경 알림 구독 중 오류 발생: {e}")
+            return
+        self.loop.create_task(self.change_poll_loop())
+    
+    async def change_poll_loop(self):
+        last_prune = time.monotonic()
+        while not self.is_closed() and self.change_feed is not None:
+            await asyncio.sleep(CHANGE_POLL_INTERVAL)
+            try:
+                self.change_seq, changes = await asyncio.to_thread(self.change_feed.poll, self.change_seq)
+                if changes:
+                    await self.apply_changes(changes)
+                if time.monotonic() - last_prune > CHANGE_RETENTION:
+                    last_prune = time.monotonic()
+                    cutoff = datetime.datetime.now().timestamp() - CHANGE_RETENTION
+                    await asyncio.to_thread(self.change_feed.prune, cutoff)
+            except Exception as e:
+                print(f"변경 알림 처리 중 오류 발생: {e}")
+    
+    async def apply_changes(self, changes: List[Tuple[str, Optional[int], str]]):
+        """다른 프로세스가 바꾼 서버 설정과 티켓 기록을 다시 읽어 캐시에 반영합니다."""
+        channel_ids = []
+        for kind, guild_id, key in changes:
+            if kind == "settings" and self.settings_store is not None:
+                # 아직 기록하지 않은 이 프로세스의 변경이 우선
+                if key in self.dirty_settings:
+                    continue
+                settings = await asyncio.to_thread(self.settings_store.load_guild, key)
+                if settings is None:
+                    self.ticket_settings.pop(key, None)
+                else:
+                    self.ticket_settings[key] = settings
+                self.invalidate_guild_config(guild_id)
+                guild = self.get_guild(guild_id)
+                if guild:
+                    self.index_guild(guild)
+            elif kind == "ticket":
+                channel_ids.append(int(key))
+        if not channel_ids or self.ticket_store is None:
+            return
+        for record in await asyncio.to_thread(self.ticket_store.load, channel_ids):
+            # 다른 샤드 그룹의 티켓은 그 프로세스가 관리
+            if not self.owns_guild(record.guild_id):
+                continue
+            if record.status == "open":
+                self.active_tickets[record.channel_id] = record
             else:
-                with open('ticket_settings.json', 'w', encoding='utf-8') as f:
-                    json.dump({}, f, ensure_ascii=False, indent=4)
+                self.active_tickets.pop(record.channel_id, None)
+            guild = self.get_guild(record.guild_id)
+            channel = guild.get_channel_or_thread(record.channel_id) if guild else None
+            if channel is not None:
+                self.index_channel(channel)
+            elif record.status != "open":
+                self.ticket_index.remove(record.channel_id)
+    
+    async def load_stats(self):
+        """통계 저장소에서 누적 통계를 로드하고 주기적인 저장을 시작합니다."""
+        try:
+            if self.stats_store is None:
+                self.stats_store = await asyncio.to_thread(StatsStore)
+            self.ticket_stats = await asyncio.to_thread(self.stats_store.load)
+        except Exception as e:
+            print(f"통계 로드 중 오류 발생: {e}")
+        if self.stats_flush_task is None:
+            self.stats_flush_task = self.loop.create_task(self.stats_flush_loop())
+    
+    async def stats_flush_loop(self):
+        while not self.is_closed():
+            await asyncio.sleep(STATS_FLUSH_INTERVAL)
+            await self.flush_stats()
+    
+    async def flush_stats(self):
+        """변경된 통계를 이벤트 루프 밖에서 저장하고 오래된 시간별 집계를 정리합니다."""
+        cutoff = stats_hour(datetime.datetime.now().timestamp() - 86400 * STATS_HOURLY_RETENTION_DAYS)
+        self.ticket_stats.prune_hourly(cutoff)
+        if self.stats_store is None or not self.ticket_stats.dirty:
+            return
+        rows = self.ticket_stats.take_dirty()
+        try:
+            await asyncio.to_thread(self.stats_store.save, rows, cutoff)
+        except Exception as e:
+            print(f"통계 저장 중 오류 발생: {e}")
+            self.ticket_stats.dirty.update((row[0], row[1], row[2]) for row in rows)
+    
+    async def start_metrics(self):
+        """REST 요청 스케줄러와 호출 계측, 속도 제한 로그 수집, 이벤트 루프 지연 측정, 지표 HTTP 엔드포인트를 시작합니다."""
+        request = self.http.request
+        # 전역 제한은 봇 토큰 단위라 샤드 그룹 프로세스마다 같은 몫으로 나눔
+        self.rest_scheduler = RequestScheduler(rate=max(REST_GLOBAL_RATE // PROCESS_COUNT, 1),
+                                               bucket_locks=getattr(self.http, "_locks", None))
+        
+        async def instrumented_request(route, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await self.rest_scheduler.run(route.bucket, rest_priority.get(), lambda: request(route, **kwargs))
+            finally:
+                metrics.inc("rest_requests_total", method=route.method, route=route.path)
+                metrics.observe("rest_seconds", time.perf_counter() - start, method=route.method, route=route.path)
+        
+        self.http.request = instrumented_request
+        logging.getLogger("discord.http").addHandler(RateLimitLogHandler(metrics, self.rest_scheduler.block))
+        self.loop.create_task(self.monitor_loop_lag())
+        
+        if METRICS_PORT is not None:
+            try:
+                await self.start_metrics_server()
+            except OSError as e:
+                print(f"지표 엔드포인트 시작 중 오류 발생: {e}")
+    
+    async def monitor_loop_lag(self):
+        """이벤트 루프가 예정보다 늦게 깨어난 시간을 기록합니다."""
+        while not self.is_closed():
+            start = time.perf_counter()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            lag = max(time.perf_counter() - start - LOOP_LAG_INTERVAL, 0)
+            metrics.set("event_loop_lag_seconds", lag)
+            metrics.observe("event_loop_lag_seconds_hist", lag)
+    
+    async def start_metrics_server(self):
+        """로컬 Prometheus 지표 엔드포인트(/metrics)를 엽니다."""
+        from aiohttp import web
+        
+        async def handle_metrics(request):
+            return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+        
+        app = web.Application()
+        app.router.add_get("/metrics", handle_metrics)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        # 샤드 그룹 프로세스마다 다른 포트 사용
+        port = METRICS_PORT + PROCESS_INDEX
+        await web.TCPSite(runner, METRICS_HOST, port).start()
+        self.metrics_runner = runner
+        print(f"지표 엔드포인트: http://{METRICS_HOST}:{port}/metrics")
+    
+    async def open_archive(self):
+        """트랜스크립트 보관소를 열고 하루에 한 번 보관 기간이 지난 기록을 정리합니다."""
+        if "archive" not in TRANSCRIPT_FORMATS:
+            return
+        try:
+            self.transcript_archive = await asyncio.to_thread(TranscriptArchive)
+        except Exception as e:
+            print(f"트랜스크립트 보관소 열기 중 오류 발생: {e}")
+            return
+        self.loop.create_task(self.compact_archive_loop())
+    
+    async def compact_archive_loop(self):
+        while not self.is_closed() and self.transcript_archive is not None:
+            cutoff = datetime.datetime.now().timestamp() - 86400 * TRANSCRIPT_RETENTION_DAYS
+            try:
+                removed = await asyncio.to_thread(self.transcript_archive.compact, cutoff)
+                if removed:
+                    print(f"보관 기간이 지난 트랜스크립트 {removed}개를 정리했습니다.")
+            except Exception as e:
+                print(f"트랜스크립트 정리 중 오류 발생: {e}")
+            await asyncio.sleep(86400)
+    
+    def owns_guild(self, guild_id: int) -> bool:
+        """서버가 이 프로세스의 샤드에 속하는지 확인합니다."""
+        if self.shard_ids is None or not self.shard_count:
+            return True
+        return (guild_id >> 22) % self.shard_count in self.shard_ids
+    
+    def is_staff(self, member: discord.Member, guild: discord.Guild) -> bool:
+        """사용자가 지원팀 역할을 가졌거나 관리 권한이 있는지 확인합니다."""
+        if self.is_authorized(member, guild):
+            return True
+        config = self.guild_config(guild)
+        if config is None:
+            return False
+        support_roles = set(config.support_role_ids)
+        return any(role.id in support_roles for role in getattr(member, "roles", ()))
+    
+    def open_record(self, record: TicketRecord):
+        """새 티켓 기록을 등록하고 통계에 반영합니다."""
+        self.active_tickets[record.channel_id] = record
+        self.ticket_stats.record_created(record.guild_id, record.ticket_type, record.created_at)
+    
+    def close_record(self, channel_id: int, closed_by: Optional[int] = None) -> Optional[TicketRecord]:
+        """열린 티켓 기록을 닫고 통계에 반영합니다. 저장은 호출한 쪽에서 합니다."""
+        record = self.active_tickets.pop(channel_id, None)
+        if record:
+            record.close(closed_by)
+            self.ticket_stats.record_closed(record.guild_id, record.ticket_type, record.created_at, record.closed_at)
+        return record
+    
+    async def save_tickets(self, *records: TicketRecord):
+        """티켓 기록을 이벤트 루프 밖에서 저장합니다."""
+        if self.ticket_store is None or not records:
+            return
+        try:
+            await asyncio.to_thread(self.ticket_store.save, list(records))
+        except Exception as e:
+            print(f"티켓 기록 저장 중 오류 발생: {e}")
+    
+    def run_pipeline(self, name: str, *steps: Callable[[], Awaitable]) -> asyncio.Task:
+        """서로 독립적인 단계들을 백그라운드에서 동시에 실행합니다. 각 단계는 코루틴을 만드는 함수입니다."""
+        task = self.loop.create_task(self._run_pipeline(name, steps))
+        self.pipelines.add(task)
+        task.add_done_callback(self.pipelines.discard)
+        return task
+    
+    async def _run_pipeline(self, name: str, steps):
+        results = await asyncio.gather(*(self.run_step(name, step) for step in steps), return_exceptions=True)
+        failed = [result for result in results if isinstance(result, BaseException)]
+        if failed:
+            print(f"[{name}] {len(steps)}단계 중 {len(failed)}단계 실패")
+    
+    async def run_step(self, name: str, step: Callable[[], Awaitable]):
+        """단계 하나를 실행하고 일시적인 오류는 재시도합니다."""
+        for attempt in range(1, PIPELINE_RETRIES + 1):
+            try:
+                return await step()
+            except (discord.Forbidden, discord.NotFound) as e:
+                # 권한 부족이나 삭제된 대상은 재시도해도 소용없음
+                print(f"[{name}] {getattr(step, '__name__', '작업')} 실패: {e}")
+                raise
+            except (discord.HTTPException, asyncio.TimeoutError, OSError) as e:
+                if attempt == PIPELINE_RETRIES:
+                    print(f"[{name}] {getattr(step, '__name__', '작업')} {attempt}회 시도 후 실패: {e}")
+                    raise
+                await asyncio.sleep(PIPELINE_RETRY_DELAY * 2 ** (attempt - 1))
+    
+    async def build_ticket_index(self):
+        """모든 서버의 티켓 카테고리를 한 번 훑어 열린 티켓 인덱스를 구축하고 기록과 맞춰 봅니다."""
+        await self.wait_until_ready()
+        self.startup_timings["gateway_ready"] = time.perf_counter() - self.started_at
+        with self.startup_phase("ticket_index"):
+            # 이 프로세스가 맡은 서버의 설정만 한 번에 읽음
+            await self.preload_settings(self.guilds)
+            for guild in self.guilds:
+                self.index_guild(guild)
+            await self.reconcile_tickets()
+        print(f"티켓 인덱스 구축 완료: {len(self.ticket_index.channels)}개")
+        self.report_startup()
+    
+    async def preload_settings(self, guilds: List[discord.Guild]):
+        if not isinstance(self.ticket_settings, LazySettings):
+            return
+        try:
+            await self.ticket_settings.preload([str(guild.id) for guild in guilds])
         except Exception as e:
             print(f"설정 로드 중 오류 발생: {e}")
-            self.ticket_settings = {}
     
-    def save_settings(self):
-        """티켓 설정을 파일에 저장합니다."""
-        try:
-            with open('ticket_settings.json', 'w', encoding='utf-8') as f:
-                json.dump(self.ticket_settings, f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            print(f"설정 저장 중 오류 발생: {e}")
+    async def reconcile_tickets(self):
+        """저장된 티켓 기록과 실제 채널을 맞춥니다."""
+        changed = []
+        # 채널이 사라진 티켓은 닫힘 처리
+        for channel_id, record in list(self.active_tickets.items()):
+            guild = self.get_guild(record.guild_id)
+            if guild is None or guild.get_channel_or_thread(channel_id) is not None:
+                continue
+            if self.is_thread_mode(guild.id):
+                # 보관된 스레드는 캐시에 없으므로 실제로 삭제되었는지 확인
+                try:
+                    await guild.fetch_channel(channel_id)
+                    continue
+                except discord.NotFound:
+                    pass
+                except discord.HTTPException:
+                    continue
+            changed.append(self.close_record(channel_id))
+        # 기록이 없는 티켓 채널은 채널 생성 시각으로 기록 생성
+        for channel_id, (guild_id, user_id, ticket_type) in self.ticket_index.channels.items():
+            if channel_id in self.active_tickets:
+                continue
+            guild = self.get_guild(guild_id)
+            channel = guild.get_channel_or_thread(channel_id) if guild else None
+            record = TicketRecord(
+                channel_id, guild_id, user_id, ticket_type,
+                created_at=channel.created_at.timestamp() if channel else None
+            )
+            self.open_record(record)
+            changed.append(record)
+        await self.save_tickets(*changed)
+    
+    def index_guild(self, guild: discord.Guild):
+        """서버 하나의 티켓 카테고리를 인덱스에 반영합니다."""
+        self.ticket_index.clear_guild(guild.id)
+        settings = self.ticket_settings.get(str(guild.id))
+        if not settings:
+            return
+        categories = [guild.get_channel(category_id) for category_id in ticket_category_ids(settings)]
+        categories = [category for category in categories if category]
+        for category in categories:
+            self.category_tracker.track(category)
+            for channel in category.channels:
+                self.index_channel(channel)
+        self.channel_pool.load_guild(guild, categories)
+        if self.is_thread_mode(guild.id):
+            # 보관된 스레드는 캐시에 없으므로 기록으로 인덱스를 채우고 활성 스레드를 확인
+            for record in self.active_tickets.values():
+                if record.guild_id == guild.id:
+                    self.ticket_index.add(guild.id, record.channel_id, record.opener_id, record.ticket_type)
+            parent = guild.get_channel(settings.get("thread_channel_id"))
+            for thread in getattr(parent, "threads", ()):
+                self.index_channel(thread)
+    
+    def is_ticket_category(self, guild_id: int, category_id: Optional[int]) -> bool:
+        settings = self.ticket_settings.get(str(guild_id))
+        return bool(settings) and category_id is not None and category_id in ticket_category_ids(settings)
+    
+    def is_thread_mode(self, guild_id: int) -> bool:
+        """스레드 티켓이 있을 수 있는 서버인지 확인합니다 (채널 방식으로 되돌린 뒤에도 남은 스레드 포함)."""
+        return bool(self.ticket_settings.get(str(guild_id), {}).get("thread_channel_id"))
+    
+    def is_ticket_thread(self, guild_id: int, parent_id: Optional[int]) -> bool:
+        settings = self.ticket_settings.get(str(guild_id))
+        return bool(settings) and parent_id is not None and settings.get("thread_channel_id") == parent_id
+    
+    async def ticket_category(self, guild: discord.Guild) -> Optional[discord.CategoryChannel]:
+        """새 티켓을 만들 카테고리를 골라 자리를 예약합니다. 모두 가득 차면 설정에 따라 넘침 카테고리를 만듭니다."""
+        settings = self.ticket_settings.get(str(guild.id), {})
+        category = self.category_tracker.pick(guild, ticket_category_ids(settings))
+        if category is None and settings.get("auto_overflow"):
+            # 동시에 가득 찬 요청들이 카테고리를 하나만 만들도록 함
+            await self.ticket_creation.run((guild.id, "overflow"), lambda: self.create_overflow_category(guild))
+            category = self.category_tracker.pick(guild, ticket_category_ids(settings))
+        return category
+    
+    async def create_overflow_category(self, guild: discord.Guild) -> Optional[discord.CategoryChannel]:
+        """첫 번째 티켓 카테고리의 권한을 복사한 넘침 카테고리를 만들고 설정에 추가합니다."""
+        guild_id = str(guild.id)
+        settings = self.ticket_settings.get(guild_id)
+        if not settings:
+            return None
+        category_ids = ticket_category_ids(settings)
+        primary = guild.get_channel(category_ids[0]) if category_ids else None
+        name = f"{primary.name if primary else '티켓'} {len(category_ids) + 1}"
+        try:
+            category = await guild.create_category(name, overwrites=primary.overwrites if primary else {})
+        except discord.HTTPException as e:
+            print(f"넘침 카테고리 생성 중 오류: {e}")
+            return None
+        settings["category_ids"] = category_ids + [category.id]
+        settings.setdefault("category_id", category_ids[0] if category_ids else category.id)
+        settings.setdefault("overflow_category_ids", []).append(category.id)
+        self.category_tracker.track(category)
+        self.save_settings(guild_id)
+        print(f"[{guild.name}] 넘침 카테고리 생성: {name}")
+        return category
+    
+    async def remove_overflow_category(self, guild: discord.Guild, category_id: int):
+        """비어 있는 자동 생성 넘침 카테고리를 설정에서 빼고 삭제합니다."""
+        guild_id = str(guild.id)
+        settings = self.ticket_settings.get(guild_id)
+        if not settings or category_id not in settings.get("overflow_category_ids", []):
+            return
+        if self.category_tracker.occupancy(category_id):
+            return
+        settings["overflow_category_ids"].remove(category_id)
+        settings["category_ids"] = [i for i in ticket_category_ids(settings) if i != category_id]
+        self.category_tracker.untrack(category_id)
+        self.save_settings(guild_id)
+        category = guild.get_channel(category_id)
+        if category is not None:
+            try:
+                await category.delete(reason="비어 있는 넘침 카테고리 정리")
+            except discord.HTTPException as e:
+                print(f"넘침 카테고리 삭제 중 오류: {e}")
+    
+    def identify_ticket(self, channel) -> Optional[Tuple[int, str]]:
+        """채널(또는 스레드)이 티켓이면 (개설자 ID, 티켓 종류)를 반환합니다."""
+        if isinstance(channel, discord.Thread):
+            if not self.is_ticket_thread(channel.guild.id, channel.parent_id):
+                return None
+        elif not isinstance(channel, discord.TextChannel):
+            return None
+        elif not self.is_ticket_category(channel.guild.id, channel.category_id):
+            return None
+        record = self.active_tickets.get(channel.id)
+        if record:
+            return record.opener_id, record.ticket_type
+        meta = parse_ticket_topic(getattr(channel, "topic", None))
+        if meta:
+            return meta
+        # 토픽이 없는 이전 형식 티켓: ticket-<종류>-<사용자 이름>
+        settings = self.ticket_settings.get(str(channel.guild.id), {})
+        for ticket_type in settings.get("ticket_types", []):
+            prefix = f"ticket-{ticket_type}-".lower()
+            if channel.name.startswith(prefix):
+                member = channel.guild.get_member_named(channel.name[len(prefix):])
+                if member:
+                    return member.id, ticket_type
+        return None
+    
+    def index_channel(self, channel):
+        """채널의 현재 상태를 열린 티켓 인덱스에 반영합니다."""
+        meta = self.identify_ticket(channel)
+        if meta:
+            self.ticket_index.add(channel.guild.id, channel.id, meta[0], meta[1])
+        else:
+            self.ticket_index.remove(channel.id)
+    
+    async def on_guild_join(self, guild: discord.Guild):
+        self.bulk_closer.removed_guilds.discard(guild.id)
+        await self.preload_settings([guild])
+        self.index_guild(guild)
+    
+    async def on_guild_remove(self, guild: discord.Guild):
+        await self.scheduler.purge_guild(guild.id)
+        await self.bulk_closer.purge_guild(guild.id)
+    
+    async def on_member_remove(self, member: discord.Member):
+        self.member_cache.discard(member.guild.id, member.id)
+    
+    async def on_guild_role_delete(self, role: discord.Role):
+        # 삭제된 역할이 권한 맵에 남지 않도록 무효화
+        self.invalidate_guild_config(role.guild.id)
+    
+    async def on_guild_channel_create(self, channel):
+        self.category_tracker.add(channel)
+        self.index_channel(channel)
+    
+    async def on_guild_channel_delete(self, channel):
+        if isinstance(channel, discord.CategoryChannel):
+            self.category_tracker.untrack(channel.id)
+            return
+        self.category_tracker.remove(channel)
+        self.release_category(channel.guild, getattr(channel, "category_id", None))
+        self.ticket_index.remove(channel.id)
+        self.rename_coalescer.cancel(channel.id)
+        self.channel_pool.discard(channel.guild.id, channel.id)
+        # 직접 삭제된 티켓 채널도 닫힘으로 기록
+        record = self.close_record(channel.id)
+        if record:
+            await self.save_tickets(record)
+    
+    async def on_thread_create(self, thread: discord.Thread):
+        self.index_channel(thread)
+    
+    async def on_thread_update(self, before: discord.Thread, after: discord.Thread):
+        self.index_channel(after)
+    
+    async def on_raw_thread_delete(self, payload):
+        # 캐시에 없는(보관된) 스레드가 삭제되어도 기록을 닫도록 raw 이벤트 사용
+        self.ticket_index.remove(payload.thread_id)
+        self.rename_coalescer.cancel(payload.thread_id)
+        record = self.close_record(payload.thread_id)
+        if record:
+            await self.save_tickets(record)
+    
+    async def on_guild_channel_update(self, before, after):
+        if getattr(before, "category_id", None) != getattr(after, "category_id", None):
+            self.category_tracker.remove(before)
+            self.category_tracker.add(after)
+            self.release_category(after.guild, getattr(before, "category_id", None))
+        self.index_channel(after)
+    
+    def release_category(self, guild: discord.Guild, category_id: Optional[int]):
+        """채널이 빠진 넘침 카테고리가 비었으면 정리를 예약합니다."""
+        settings = self.ticket_settings.get(str(guild.id), {})
+        if category_id in settings.get("overflow_category_ids", ()) and not self.category_tracker.occupancy(category_id):
+            self.loop.create_task(self.remove_overflow_category(guild, category_id))
+    
+    async def load_settings(self):
+        """설정 저장소를 엽니다. 서버 설정은 게이트웨이 준비 후 맡은 서버만 읽거나 처음 사용할 때 읽습니다."""
+        try:
+            if self.settings_store is None:
+                self.settings_store = await asyncio.to_thread(create_settings_store)
+        except Exception as e:
+            print(f"설정 저장소 열기 중 오류 발생: {e}")
+        self.ticket_settings = LazySettings(self.settings_store)
+    
+    def guild_config(self, guild: discord.Guild) -> Optional[GuildConfig]:
+        """서버의 해석된 설정을 반환합니다. 설정되지 않은 서버는 None입니다."""
+        config = self.guild_configs.get(guild.id)
+        if config is None:
+            settings = self.ticket_settings.get(str(guild.id))
+            if settings is None:
+                return None
+            config = self.guild_configs[guild.id] = GuildConfig(guild, settings)
+        return config
+    
+    def invalidate_guild_config(self, guild_id: int):
+        self.guild_configs.pop(guild_id, None)
+    
+    def save_settings(self, guild_id: str):
+        """서버의 티켓 설정 저장을 예약합니다. 짧은 시간 안의 저장 요청은 한 번에 기록됩니다."""
+        self.invalidate_guild_config(int(guild_id))
+        self.dirty_settings.add(guild_id)
+        if self.settings_flush_task is None or self.settings_flush_task.done():
+            self.settings_flush_task = self.loop.create_task(self.flush_settings(SETTINGS_FLUSH_DELAY))
+    
+    async def flush_settings(self, delay: float = 0):
+        """예약된 설정 변경을 이벤트 루프 밖에서 저장소에 기록합니다.
+        
+        기록하는 동안 들어온 변경이나 실패한 변경이 남아 있으면 다음 기록을 다시 예약합니다.
+        """
+        if delay:
+            await asyncio.sleep(delay)
+        if not self.dirty_settings:
+            return
+        if self.settings_store is None:
+            # 시작할 때 저장소를 열지 못했으면 변경을 버리지 않고 다시 열어 봄
+            try:
+                self.settings_store = await asyncio.to_thread(create_settings_store)
+                self.ticket_settings.store = self.settings_store
+            except Exception as e:
+                print(f"설정 저장소 열기 중 오류 발생: {e}")
+                self.reschedule_settings_flush(delay)
+                return
+        # 기록 시점의 설정을 복사해 두어 기록 중 변경과 섞이지 않게 함
+        pending = {
+            guild_id: json.loads(json.dumps(self.ticket_settings[guild_id])) if guild_id in self.ticket_settings else None
+            for guild_id in self.dirty_settings
+        }
+        self.dirty_settings.clear()
+        try:
+            await asyncio.to_thread(self.settings_store.save_guilds, pending)
+        except Exception as e:
+            print(f"설정 저장 중 오류 발생: {e}")
+            # 실패한 서버는 다음 기록 때 다시 시도
+            self.dirty_settings.update(pending)
+        self.reschedule_settings_flush(delay)
+    
+    def reschedule_settings_flush(self, delay: float):
+        """남은 변경이 있으면 다음 기록을 예약합니다. 종료 중의 마지막 기록(delay 0)은 다시 예약하지 않습니다."""
+        if self.dirty_settings and delay and not self.is_closed():
+            self.settings_flush_task = self.loop.create_task(self.flush_settings(SETTINGS_FLUSH_DELAY))
+    
+    async def close(self):
+        # 종료 전에 모아 둔 로그를 보내고 남은 설정 변경을 기록
+        await self.log_buffer.flush_all()
+        if self.settings_flush_task and not self.settings_flush_task.done():
+            self.settings_flush_task.cancel()
+        await self.flush_settings()
+        if self.stats_flush_task is not None:
+            self.stats_flush_task.cancel()
+        await self.flush_stats()
+        if self.stats_store is not None:
+            self.stats_store.close()
+            self.stats_store = None
+        if self.settings_store is not None:
+            self.settings_store.close()
+            self.settings_store = None
+        if self.ticket_store is not None:
+            self.ticket_store.close()
+            self.ticket_store = None
+        if self.change_feed is not None:
+            self.change_feed.close()
+            self.change_feed = None
+        self.bulk_closer.close()
+        self.scheduler.close()
+        if self.transcript_archive is not None:
+            self.transcript_archive.close()
+            self.transcript_archive = None
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+            self.metrics_runner = None
+        await super().close()
+    
+    def is_authorized(self, user: discord.User, guild: discord.Guild) -> bool:
+        """사용자가 개발자이거나 서버 소유자인지 확인합니다."""
+        return user.id in self.developer_ids or user.id == guild.owner_id
+
+# 인텐트 설정
+intents = discord.Intents.default()
+intents.message_content = True
+intents.members = True
+
+# 봇 생성
+bot = TicketBot(command_prefix="!", intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+
+# 권한 확인 함수
+async def check_permission(interaction: discord.Interaction) -> bool:
+    """사용자가 명령어를 사용할 권한이 있는지 확인합니다."""
+    if not bot.is_authorized(interaction.user, interaction.guild):
+        await interaction.response.send_message("이 명령어는 서버 소유자나 개발자만 사용할 수 있습니다.", ephemeral=True)
+        return False
+    return True
+
+# 티켓 설정 명령어
+@bot.slash_command(name="설정", description="티켓 시스템을 설정합니다")
+@discord.default_permissions(administrator=True)
+async def setup(interaction: discord.Interaction):
+    """티켓 시스템 설정 명령어"""
+    if not await check_permission(interaction):
+        return
+    await interaction.response.send_modal(TicketSetupModal(bot))
+
+# 티켓 패널 생성 명령어
+@bot.slash_command(name="티켓패널", description="티켓 생성 패널을 설정합니다")
+@discord.default_permissions(administrator=True)
+async def ticket_panel(interaction: discord.Interaction):
+    """티켓 패널 생성 명령어"""
+    if not await check_permission(interaction):
+        return
+    
+    # 설정 확인
+    guild_id = str(interaction.guild_id)
+    if guild_id not in bot.ticket_settings:
+        await interaction.response.send_message("먼저 `/설정` 명령어로 티켓 시스템을 설정해주세요.", ephemeral=True)
+        return
+    
+    config = bot.guild_config(interaction.guild)
+    
+    # 티켓 유형 확인
+    if not config.ticket_types:
+        await interaction.response.send_message("티켓 유형이 설정되지 않았습니다.", ephemeral=True)
+        return
+    
+    # 티켓 패널 전송
+    try:
+        await interaction.channel.send(
+            embed=config.panel_embed,
+            view=config.panel_view(bot)
+        )
+        await interaction.response.send_message("티켓 패널이 생성되었습니다.", ephemeral=True)
+    except Exception as e:
+        await interaction.response.send_message(f"패널 생성 중 오류가 발생했습니다: {e}", ephemeral=True)
+
+# 임베드 설정 명령어
+@bot.slash_command(name="임베드설정", description="티켓 시스템의 임베드를 커스텀마이징합니다")
+@discord.default_permissions(administrator=True)
+async def setup_embed(
+    interaction: discord.Interaction, 
+    embed_type: str = discord.Option("임베드 유형을 선택하세요", choices=["티켓 패널", "티켓 생성", "티켓 닫힘"])
+):
+    if not await check_permission(interaction):
+        return
+    
+    await interaction.response.send_modal(EmbedCustomizationModal(bot, embed_type))
+
+# 대기 채널 풀 명령어
+@bot.slash_command(name="티켓풀", description="미리 만들어 둘 티켓 채널 수를 설정하고 풀 통계를 확인합니다")
+@discord.default_permissions(administrator=True)
+async def channel_pool(
+    interaction: discord.Interaction,
+    size: int = discord.Option(int, "대기 채널 수 (0이면 끔)", name="크기", required=False, min_value=0, max_value=25)
+):
+    if not await check_permission(interaction):
+        return
+    
+    guild_id = str(interaction.guild_id)
+    if guild_id not in bot.ticket_settings:
+        await interaction.response.send_message("먼저 `/설정` 명령어로 티켓 시스템을 설정해주세요.", ephemeral=True)
+        return
+    
+    # 목표 크기 변경
+    if size is not None:
+        bot.ticket_settings[guild_id]["channel_pool_size"] = size
+        bot.save_settings(guild_id)
+        bot.channel_pool.schedule_refill(interaction.guild)
+    
+    stats = bot.channel_pool.stats()
+    embed = discord.Embed(title="🧊 대기 채널 풀", color=discord.Color.blue())
+    embed.add_field(name="목표 크기", value=str(bot.channel_pool.target_size(interaction.guild_id)), inline=True)
+    embed.add_field(name="현재 크기", value=str(bot.channel_pool.size(interaction.guild_id)), inline=True)
+    embed.add_field(name="적중률", value=f"{stats['hit_rate']:.0%} ({stats['hits']}/{stats['hits'] + stats['misses']})", inline=True)
+    embed.add_field(name="보충 지연", value=f"최근 {stats['last_refill_lag']:.1f}초 / 최대 {stats['max_refill_lag']:.1f}초", inline=True)
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+# 유휴 티켓 자동 종료 설정 명령어
+@bot.slash_command(name="자동종료", description="활동이 없는 티켓을 자동으로 닫을 시간을 설정합니다")
+@discord.default_permissions(administrator=True)
+async def idle_close(
+    interaction: discord.Interaction,
+    hours: int = discord.Option(int, "마지막 메시지 이후 시간 (0이면 끔)", name="시간", min_value=0, max_value=720)
+):
+    if not await check_permission(interaction):
+        return
+    
+    guild_id = str(interaction.guild_id)
+    if guild_id not in bot.ticket_settings:
+        await interaction.response.send_message("먼저 `/설정` 명령어로 티켓 시스템을 설정해주세요.", ephemeral=True)
+        return
     
-    def is_authorized(self, user: discord.User, guild: discord.Guild) -> bool:
-        """사용자가 개발자이거나 서버 소유자인지 확인합니다."""
-        return user.id in self.developer_ids or user.id == guild.owner_id
-
-# 인텐트 설정
-intents = discord.Intents.default()
-intents.message_content = True
-intents.members = True
+    bot.ticket_settings[guild_id]["idle_close_hours"] = hours or None
+    bot.save_settings(guild_id)
+    if hours:
+        await interaction.response.send_message(f"{hours}시간 동안 활동이 없는 티켓을 자동으로 닫습니다.", ephemeral=True)
+    else:
+        await interaction.response.send_message("유휴 티켓 자동 종료를 껐습니다.", ephemeral=True)
 
-# 봇 생성
-bot = TicketBot(command_prefix="!", intents=intents)
-
-# 권한 확인 함수
-async def check_permission(interaction: discord.Interaction) -> bool:
-    """사용자가 명령어를 사용할 권한이 있는지 확인합니다."""
-    if not bot.is_authorized(interaction.user, interaction.guild):
-        await interaction.response.send_message("이 명령어는 서버 소유자나 개발자만 사용할 수 있습니다.", ephemeral=True)
-        return False
-    return True
-
-# 티켓 설정 명령어
-@bot.slash_command(name="설정", description="티켓 시스템을 설정합니다")
+# 티켓 일괄 종료 명령어
+@bot.slash_command(name="일괄종료", description="열린 티켓을 한 번에 닫습니다")
 @discord.default_permissions(administrator=True)
-async def setup(interaction: discord.Interaction):
-    """티켓 시스템 설정 명령어"""
+async def bulk_close(
+    interaction: discord.Interaction,
+    hours: int = discord.Option(int, "이 시간 동안 활동이 없는 티켓만 (0이면 모든 티켓)", name="유휴시간", min_value=0),
+    ticket_type: str = discord.Option(str, "티켓 종류", name="종류", required=False, default=None)
+):
     if not await check_permission(interaction):
         return
-    await interaction.response.send_modal(TicketSetupModal(bot))
+    
+    if str(interaction.guild_id) not in bot.ticket_settings:
+        await interaction.response.send_message("티켓 시스템이 설정되지 않았습니다.", ephemeral=True)
+        return
+    
+    await interaction.response.defer(ephemeral=True)
+    targets = bot.idle_tickets(interaction.guild, hours, ticket_type)
+    reason = f"일괄 종료 ({hours}시간 이상 활동 없음)" if hours else "일괄 종료"
+    batch = await bot.bulk_closer.submit(interaction.guild_id, targets, interaction.user.id, reason)
+    if not batch.total:
+        await interaction.followup.send("닫을 티켓이 없습니다.", ephemeral=True)
+        return
+    
+    # 진행 상황을 주기적으로 갱신
+    await interaction.edit_original_response(content=f"티켓 {batch.total}개를 닫는 중... {batch.progress()}")
+    while not batch.finished.is_set():
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(batch.finished.wait(), CLOSE_PROGRESS_INTERVAL)
+        try:
+            if batch.finished.is_set():
+                await interaction.edit_original_response(content=f"일괄 종료 완료: {batch.progress()}")
+            else:
+                await interaction.edit_original_response(content=f"티켓 {batch.total}개를 닫는 중... {batch.progress()}")
+        except discord.HTTPException:
+            # 상호작용 토큰이 만료되어도 작업은 계속 진행
+            break
 
-# 티켓 패널 생성 명령어
-@bot.slash_command(name="티켓패널", description="티켓 생성 패널을 설정합니다")
+# 티켓 카테고리 명령어
+@bot.slash_command(name="카테고리", description="티켓 카테고리 사용량을 확인하고 넘침 카테고리 자동 생성을 설정합니다")
 @discord.default_permissions(administrator=True)
-async def ticket_panel(interaction: discord.Interaction):
-    """티켓 패널 생성 명령어"""
+async def ticket_categories(
+    interaction: discord.Interaction,
+    auto_overflow: bool = discord.Option(bool, "카테고리가 가득 차면 새 카테고리를 자동으로 만들고 비면 삭제", name="자동추가", required=False, default=None)
+):
     if not await check_permission(interaction):
         return
     
-    # 설정 확인
     guild_id = str(interaction.guild_id)
     if guild_id not in bot.ticket_settings:
         await interaction.response.send_message("먼저 `/설정` 명령어로 티켓 시스템을 설정해주세요.", ephemeral=True)
         return
     
     settings = bot.ticket_settings[guild_id]
+    if auto_overflow is not None:
+        settings["auto_overflow"] = auto_overflow
+        bot.save_settings(guild_id)
     
-    # 티켓 유형 확인
-    ticket_types = settings.get("ticket_types", [])
-    if not ticket_types:
-        await interaction.response.send_message("티켓 유형이 설정되지 않았습니다.", ephemeral=True)
-        return
+    embed = discord.Embed(title="🗂️ 티켓 카테고리", color=discord.Color.blue())
+    embed.add_field(name="자동 추가", value="켜짐" if settings.get("auto_overflow") else "꺼짐", inline=False)
+    overflow_ids = settings.get("overflow_category_ids", [])
+    for category_id in ticket_category_ids(settings)[:20]:
+        category = interaction.guild.get_channel(category_id)
+        if category is None:
+            embed.add_field(name=str(category_id), value="찾을 수 없음", inline=True)
+            continue
+        if category_id not in bot.category_tracker.channels:
+            bot.category_tracker.track(category)
+        label = f"{category.name} (자동)" if category_id in overflow_ids else category.name
+        embed.add_field(name=label, value=f"{bot.category_tracker.occupancy(category_id)}/{CATEGORY_CHANNEL_LIMIT}", inline=True)
     
-    # 임베드 설정
-    embed_settings = settings.get("ticket_panel_embed", {
-        "title": "🎫 티켓 시스템",
-        "description": "아래 버튼을 클릭하여 새로운 티켓을 생성하세요.",
-        "color": 0x3498db,
-        "footer": "문의사항이 있으시면 티켓을 생성해주세요."
-    })
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+# 티켓 방식 명령어
+@bot.slash_command(name="티켓방식", description="티켓을 채널로 만들지 지원 채널 아래 비공개 스레드로 만들지 설정합니다")
+@discord.default_permissions(administrator=True)
+async def ticket_mode(
+    interaction: discord.Interaction,
+    mode: str = discord.Option(str, "티켓 방식", name="방식", choices=["채널", "스레드"]),
+    support_channel: discord.TextChannel = discord.Option(discord.TextChannel, "스레드를 만들 지원 채널 (스레드 방식)", name="지원채널", required=False, default=None)
+):
+    if not await check_permission(interaction):
+        return
     
-    embed = discord.Embed(
-        title=embed_settings.get("title"),
-        description=embed_settings.get("description"),
-        color=embed_settings.get("color")
-    )
+    guild_id = str(interaction.guild_id)
+    if guild_id not in bot.ticket_settings:
+        await interaction.response.send_message("먼저 `/설정` 명령어로 티켓 시스템을 설정해주세요.", ephemeral=True)
+        return
     
-    if embed_settings.get("footer"):
-        embed.set_footer(text=embed_settings.get("footer"))
+    settings = bot.ticket_settings[guild_id]
+    if mode == "스레드":
+        if support_channel is None and not settings.get("thread_channel_id"):
+            await interaction.response.send_message("스레드 방식에는 지원 채널이 필요합니다.", ephemeral=True)
+            return
+        if support_channel is not None:
+            settings["thread_channel_id"] = support_channel.id
+        settings["ticket_mode"] = "thread"
+        message = f"이제 티켓이 <#{settings['thread_channel_id']}> 아래 비공개 스레드로 만들어집니다."
+    else:
+        settings["ticket_mode"] = "channel"
+        message = "이제 티켓이 티켓 카테고리 안의 채널로 만들어집니다."
+    bot.save_settings(guild_id)
     
-    # 티켓 패널 전송
-    try:
-        await interaction.channel.send(
-            embed=embed,
-            view=TicketPanelView(bot, ticket_types)
-        )
-        await interaction.response.send_message("티켓 패널이 생성되었습니다.", ephemeral=True)
-    except Exception as e:
-        await interaction.response.send_message(f"패널 생성 중 오류가 발생했습니다: {e}", ephemeral=True)
+    # 기존 티켓은 방식과 관계없이 계속 인식
+    bot.index_guild(interaction.guild)
+    await interaction.response.send_message(message, ephemeral=True)
 
-# 임베드 설정 명령어
-@bot.slash_command(name="임베드설정", description="티켓 시스템의 임베드를 커스텀마이징합니다")
+# 로그 방식 명령어
+@bot.slash_command(name="로그방식", description="로그 채널 기록을 모아서 보낼지 바로 보낼지 설정합니다")
 @discord.default_permissions(administrator=True)
-async def setup_embed(
-    interaction: discord.Interaction, 
-    embed_type: str = discord.Option("임베드 유형을 선택하세요", choices=["티켓 패널", "티켓 생성", "티켓 닫힘"])
+async def log_mode(
+    interaction: discord.Interaction,
+    mode: str = discord.Option(str, "로그 방식", name="방식", choices=["묶음", "즉시"])
 ):
     if not await check_permission(interaction):
         return
     
-    await interaction.response.send_modal(EmbedCustomizationModal(bot, embed_type))
+    guild_id = str(interaction.guild_id)
+    if guild_id not in bot.ticket_settings:
+        await interaction.response.send_message("먼저 `/설정` 명령어로 티켓 시스템을 설정해주세요.", ephemeral=True)
+        return
+    
+    bot.ticket_settings[guild_id]["log_mode"] = "digest" if mode == "묶음" else "immediate"
+    bot.save_settings(guild_id)
+    if mode == "묶음":
+        message = f"로그를 최대 {LOG_DIGEST_DELAY:g}초 동안 모아 메시지 하나(임베드 최대 {LOG_DIGEST_SIZE}개)로 보냅니다."
+    else:
+        message = "로그를 이벤트마다 바로 보냅니다."
+    await interaction.response.send_message(message, ephemeral=True)
 
 # 통계 명령어
 @bot.slash_command(name="통계", description="티켓 시스템 통계를 확인합니다")
-async def statistics(interaction: discord.Interaction):
+async def statistics(
+    interaction: discord.Interaction,
+    days: str = discord.Option(str, "통계 기간", name="기간", required=False, choices=["1일", "7일", "30일", "90일", "전체"], default="7일")
+):
     """티켓 통계 명령어"""
     if not await check_permission(interaction):
         return
@@ -152,40 +3152,127 @@ async def statistics(interaction: discord.Interaction):
     settings = bot.ticket_settings[guild_id]
     
     # 카테고리 확인
-    if "category_id" not in settings:
+    if not ticket_category_ids(settings):
         await interaction.response.send_message("티켓 카테고리가 설정되지 않았습니다.", ephemeral=True)
         return
     
-    category = interaction.guild.get_channel(settings["category_id"])
-    if not category:
-        await interaction.response.send_message("설정된 티켓 카테고리를 찾을 수 없습니다.", ephemeral=True)
-        return
-    
-    # 티켓 통계 계산
-    total_tickets = 0
-    tickets_by_type = {}
+    # 열린 티켓 (열린 티켓 인덱스에서 조회)
+    total_tickets = bot.ticket_index.guild_count(interaction.guild_id)
+    tickets_by_type = bot.ticket_index.type_counts(interaction.guild_id)
     
-    for channel in category.channels:
-        if channel.name.startswith("ticket-"):
-            total_tickets += 1
-            parts = channel.name.split("-")
-            if len(parts) > 1:
-                ticket_type = parts[1]
-                tickets_by_type[ticket_type] = tickets_by_type.get(ticket_type, 0) + 1
+    # 기간 통계 (누적 통계에서 조회)
+    window = None if days == "전체" else int(days.rstrip("일"))
+    summary = bot.ticket_stats.summary(interaction.guild_id, window)
     
     # 통계 임베드 생성
     embed = discord.Embed(
         title="📊 티켓 시스템 통계",
+        description=f"기간: {days}",
         color=discord.Color.blue()
     )
     
     embed.add_field(name="총 활성 티켓", value=str(total_tickets), inline=False)
+    embed.add_field(name="생성된 티켓", value=str(summary["created"]), inline=True)
+    embed.add_field(name="닫힌 티켓", value=str(summary["closed"]), inline=True)
+    
+    if summary["p50"] is not None:
+        p50 = str(datetime.timedelta(seconds=int(summary["p50"])))
+        p95 = str(datetime.timedelta(seconds=int(summary["p95"])))
+        embed.add_field(name="처리 시간 (p50 / p95)", value=f"{p50} / {p95}", inline=True)
+    
+    # 임베드 필드 수 제한(25개)에 맞춰 종류는 최대 20개까지 표시
+    for ticket_type in sorted(set(tickets_by_type) | set(summary["by_type"]))[:20]:
+        created, closed = summary["by_type"].get(ticket_type, (0, 0))
+        embed.add_field(
+            name=f"{ticket_type} 티켓",
+            value=f"활성 {tickets_by_type.get(ticket_type, 0)} · 생성 {created} · 닫힘 {closed}",
+            inline=True
+        )
     
-    for ticket_type, count in tickets_by_type.items():
-        embed.add_field(name=f"{ticket_type} 티켓", value=str(count), inline=True)
+    # 추이 (1일은 시간별, 그 외는 일별)
+    trend = bot.ticket_stats.hourly_trend(interaction.guild_id) if window == 1 else summary["trend"][-14:]
+    if trend:
+        lines = [f"{period[2:]}: +{created} / -{closed}" for period, created, closed in trend if created or closed]
+        embed.add_field(name="추이 (생성 / 닫힘)", value="\n".join(lines[-24:]) or "기록 없음", inline=False)
     
     await interaction.response.send_message(embed=embed)
 
+# 진단 명령어
+@bot.slash_command(name="진단", description="봇의 성능 지표를 확인합니다")
+async def diagnostics(interaction: discord.Interaction):
+    """진단 명령어"""
+    if not await check_permission(interaction):
+        return
+    
+    def describe(histogram: Optional[Histogram]) -> str:
+        if histogram is None or not histogram.count:
+            return "기록 없음"
+        return f"p50 ≤{histogram.quantile(0.5)}초 · p95 ≤{histogram.quantile(0.95)}초 · {histogram.count}회"
+    
+    embed = discord.Embed(title="🩺 진단", color=discord.Color.blue())
+    
+    handlers = sorted({dict(labels)["handler"] for name, labels in metrics.histograms if name == "handler_seconds"})
+    for handler in handlers:
+        embed.add_field(name=f"처리기: {handler}", value=describe(metrics.histogram("handler_seconds", handler=handler)), inline=False)
+    for phase in ("index_lookup", "channel_create", "send", "history_fetch", "file_write"):
+        histogram = metrics.histogram("phase_seconds", phase=phase)
+        if histogram is not None:
+            embed.add_field(name=f"단계: {phase}", value=describe(histogram), inline=False)
+    
+    embed.add_field(name="REST 호출", value=str(int(metrics.total("rest_requests_total"))), inline=True)
+    embed.add_field(name="속도 제한 대기", value=str(int(metrics.total("ratelimit_waits_total"))), inline=True)
+    lag = metrics.gauges.get(Metrics.key("event_loop_lag_seconds", {}), 0.0)
+    embed.add_field(name="이벤트 루프 지연", value=f"{lag * 1000:.1f}ms", inline=True)
+    queue = []
+    for priority in REST_PRIORITIES:
+        depth = int(metrics.gauges.get(Metrics.key("rest_queue_depth", {"priority": priority}), 0))
+        histogram = metrics.histogram("rest_queue_wait_seconds", priority=priority)
+        if depth or histogram is not None:
+            queue.append(f"{priority}: 대기 {depth}건 · {describe(histogram)}")
+    if queue:
+        embed.add_field(name="REST 대기열", value="\n".join(queue), inline=False)
+    if bot.startup_timings:
+        phases = "\n".join(f"{phase}: {seconds * 1000:.0f}ms" for phase, seconds in bot.startup_timings.items())
+        embed.add_field(name="시작 단계", value=phases, inline=False)
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+# 트랜스크립트 검색 명령어
+@bot.slash_command(name="기록검색", description="닫힌 티켓의 대화 기록을 검색합니다")
+async def search_transcripts(
+    interaction: discord.Interaction,
+    query: str = discord.Option(str, "검색어", name="검색어"),
+    opener: discord.Member = discord.Option(discord.Member, "티켓 개설자", name="개설자", required=False, default=None),
+    ticket_type: str = discord.Option(str, "티켓 종류", name="종류", required=False, default=None)
+):
+    if not bot.is_staff(interaction.user, interaction.guild):
+        await interaction.response.send_message("이 명령어는 지원팀만 사용할 수 있습니다.", ephemeral=True)
+        return
+    
+    if bot.transcript_archive is None:
+        await interaction.response.send_message("트랜스크립트 보관소가 활성화되지 않았습니다.", ephemeral=True)
+        return
+    
+    results = await asyncio.to_thread(
+        bot.transcript_archive.search,
+        interaction.guild_id, query, opener.id if opener else None, ticket_type
+    )
+    
+    if not results:
+        await interaction.response.send_message("검색 결과가 없습니다.", ephemeral=True)
+        return
+    
+    embed = discord.Embed(title=f"🔎 기록 검색: {query}", color=discord.Color.blue())
+    for channel_id, channel_name, opener_id, result_type, closed_at, excerpt in results:
+        closed = datetime.datetime.fromtimestamp(closed_at).strftime("%Y-%m-%d %H:%M")
+        embed.add_field(
+            name=f"{channel_name} ({result_type})",
+            value=f"개설자: <@{opener_id}> · 닫힘: {closed} · ID: {channel_id}\n{excerpt}"[:1024],
+            inline=False
+        )
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
 # 티켓 설정 모달
 class TicketSetupModal(discord.ui.Modal):
     def __init__(self, bot: TicketBot):
@@ -194,7 +3281,7 @@ class TicketSetupModal(discord.ui.Modal):
         
         self.category = discord.ui.TextInput(
             label="티켓 카테고리 ID",
-            placeholder="티켓이 생성될 카테고리의 ID를 입력하세요",
+            placeholder="티켓이 생성될 카테고리의 ID를 입력하세요 (여러 개는 쉼표로 구분)",
             required=True
         )
         
@@ -208,7 +3295,7 @@ class TicketSetupModal(discord.ui.Modal):
             label="티켓 종류",
             placeholder="티켓 종류를 쉼표로 구분하여 입력하세요 (예: 구매문의,판매문의,기술지원)",
             required=True,
-            style=discord.TextStyle.paragraph
+            style=discord.InputTextStyle.paragraph
         )
         
         self.log_channel = discord.ui.TextInput(
@@ -233,17 +3320,34 @@ class TicketSetupModal(discord.ui.Modal):
         try:
             guild_id = str(interaction.guild_id)
             
-            # 설정 저장
-            self.bot.ticket_settings[guild_id] = {
-                "category_id": int(self.category.value),
-                "support_role_ids": [int(role.strip()) for role in self.support_roles.value.split(",")],
-                "ticket_types": [type.strip() for type in self.ticket_types.value.split(",")],
+            category_ids = [int(category.strip()) for category in self.category.value.split(",") if category.strip()]
+            support_role_ids = [int(role.strip()) for role in self.support_roles.value.split(",") if role.strip()]
+            ticket_types = [type.strip() for type in self.ticket_types.value.split(",") if type.strip()]
+            if not category_ids or not support_role_ids or not ticket_types:
+                await interaction.response.send_message("카테고리 ID, 지원팀 역할 ID, 티켓 종류를 하나 이상 입력해주세요.", ephemeral=True)
+                return
+            
+            # 이 모달에 없는 설정(티켓 방식, 로그 방식, 자동 추가 카테고리 등)은 그대로 유지
+            settings = self.bot.ticket_settings.get(guild_id) or {}
+            overflow_ids = [i for i in settings.get("overflow_category_ids", []) if i not in category_ids]
+            if "overflow_category_ids" in settings:
+                # 직접 입력한 카테고리는 더 이상 자동 추가 카테고리로 보지 않음
+                settings["overflow_category_ids"] = overflow_ids
+            settings.update({
+                "category_id": category_ids[0],
+                "category_ids": category_ids + overflow_ids,
+                "support_role_ids": support_role_ids,
+                "ticket_types": ticket_types,
                 "log_channel_id": int(self.log_channel.value),
                 "max_tickets_per_user": int(self.max_tickets.value) if self.max_tickets.value else 3
-            }
+            })
+            self.bot.ticket_settings[guild_id] = settings
             
             # 설정 저장
-            self.bot.save_settings()
+            self.bot.save_settings(guild_id)
+            
+            # 카테고리가 바뀌었을 수 있으므로 인덱스 재구축
+            self.bot.index_guild(interaction.guild)
             
             embed = discord.Embed(
                 title="✅ 티켓 설정 완료",
@@ -307,14 +3411,14 @@ class EmbedCustomizationModal(discord.ui.Modal):
         if guild_id not in self.bot.ticket_settings:
             self.bot.ticket_settings[guild_id] = {}
         
-        self.bot.ticket_settings[guild_id][f"{self.embed_type}_embed"] = {
+        self.bot.ticket_settings[guild_id][EMBED_SETTING_KEYS[self.embed_type]] = {
             "title": self.title_input.value,
             "description": self.description_input.value,
             "color": color_value,
             "footer": self.footer_input.value if self.footer_input.value else None
         }
         
-        self.bot.save_settings()
+        self.bot.save_settings(guild_id)
         
         embed = discord.Embed(
             title="✅ 임베드 설정 완료",
@@ -331,39 +3435,311 @@ class AddParticipantModal(discord.ui.Modal):
         self.ticket_channel = ticket_channel
         
         self.user_id = discord.ui.TextInput(
-            label="사용자 ID",
-            placeholder="추가할 사용자의 ID를 입력하세요",
-            required=True
+            label="사용자 ID 또는 멘션",
+            placeholder="추가할 사용자의 ID나 멘션을 입력하세요 (여러 명은 쉼표나 줄바꿈으로 구분)",
+            required=True,
+            style=discord.InputTextStyle.paragraph
         )
         
         self.add_item(self.user_id)
     
     async def callback(self, interaction: discord.Interaction):
+        user_ids = parse_user_ids(self.user_id.value)
+        if not user_ids:
+            await interaction.response.send_message("사용자 ID나 멘션을 입력해주세요.", ephemeral=True)
+            return
+        if len(user_ids) > PARTICIPANT_ADD_LIMIT:
+            await interaction.response.send_message(f"한 번에 최대 {PARTICIPANT_ADD_LIMIT}명까지 추가할 수 있습니다.", ephemeral=True)
+            return
+        
+        # 멤버 조회가 3초 응답 제한을 넘길 수 있으므로 먼저 응답 보류
+        await interaction.response.defer(ephemeral=True)
         try:
-            # 사용자 찾기
-            user = await interaction.guild.fetch_member(int(self.user_id.value))
+            # 사용자 찾기 (캐시 우선)
+            resolved = await interaction.client.member_cache.resolve_many(interaction.guild, user_ids)
+            members = [member for member in resolved.values() if member is not None]
+            missing = [user_id for user_id, member in resolved.items() if member is None]
             
-            # 티켓 채널에 권한 추가
-            await self.ticket_channel.set_permissions(user, read_messages=True, send_messages=True)
+            if members and isinstance(self.ticket_channel, discord.Thread):
+                # 스레드 티켓은 권한 대신 스레드 멤버로 추가
+                await asyncio.gather(*(self.ticket_channel.add_user(member) for member in members))
+            elif members:
+                # 티켓 채널에 권한을 한 번에 추가
+                overwrites = dict(self.ticket_channel.overwrites)
+                for member in members:
+                    overwrite = overwrites.get(member)
+                    if overwrite is None:
+                        overwrites[member] = MEMBER_OVERWRITE
+                    else:
+                        overwrite = discord.PermissionOverwrite(**dict(overwrite))
+                        overwrite.update(read_messages=True, send_messages=True)
+                        overwrites[member] = overwrite
+                await self.ticket_channel.edit(overwrites=overwrites)
             
-            await interaction.response.send_message(f"{user.mention}님이 티켓에 추가되었습니다.", ephemeral=True)
+            message = ""
+            if members:
+                message = f"{', '.join(member.mention for member in members)}님이 티켓에 추가되었습니다."
+            if missing:
+                message += f"\n사용자를 찾을 수 없습니다: {', '.join(map(str, missing))}"
+            await interaction.followup.send(message.strip(), ephemeral=True)
         except Exception as e:
             print(f"참여자 추가 중 오류: {e}")
-            await interaction.response.send_message("사용자를 찾을 수 없습니다.", ephemeral=True)
+            await interaction.followup.send("참여자를 추가하지 못했습니다.", ephemeral=True)
 
-# 티켓 타이머 클래스
-class TicketTimer:
-    def __init__(self):
-        self.start_time = datetime.datetime.now()
-        self.end_time = None
+# 트랜스크립트 렌더링
+def message_to_record(message: discord.Message) -> dict:
+    """메시지에서 트랜스크립트에 필요한 값만 뽑아 일반 dict로 만듭니다. 렌더링은 이 dict로 이벤트 루프 밖에서 합니다."""
+    author = message.author
+    avatar = getattr(author, "display_avatar", None)
+    reference = getattr(message, "reference", None)
+    edited_at = getattr(message, "edited_at", None)
+    return {
+        "id": message.id,
+        "created_at": message.created_at.isoformat(),
+        "edited_at": edited_at.isoformat() if edited_at else None,
+        "author": {
+            "id": author.id,
+            "name": author.name,
+            "display_name": getattr(author, "display_name", author.name),
+            "avatar_url": avatar.url if avatar else None,
+            "bot": getattr(author, "bot", False),
+        },
+        "content": message.content,
+        "reply_to": reference.message_id if reference else None,
+        "attachments": [
+            {"filename": a.filename, "url": a.url, "size": a.size, "content_type": a.content_type}
+            for a in message.attachments
+        ],
+        "embeds": [embed.to_dict() for embed in message.embeds],
+    }
+
+class TranscriptRenderer:
+    """메시지 dict 묶음을 파일 형식 하나로 변환합니다. 상태가 없어 모든 티켓이 공유합니다."""
+    extension = ""
     
-    def close(self):
-        self.end_time = datetime.datetime.now()
+    def header(self, title: str) -> str:
+        return ""
+    
+    def render(self, records: List[dict]) -> str:
+        raise NotImplementedError
+    
+    def footer(self) -> str:
+        return ""
+
+class TextRenderer(TranscriptRenderer):
+    """사람이 읽는 텍스트 트랜스크립트입니다 (메시지당 한 줄)."""
+    extension = "txt"
+    
+    def line(self, record: dict) -> str:
+        timestamp = datetime.datetime.fromisoformat(record["created_at"]).strftime("%Y-%m-%d %H:%M:%S")
+        parts = [record["content"]] if record["content"] else []
+        parts += [f"[임베드: {embed.get('title') or embed.get('description') or '제목 없음'}]" for embed in record["embeds"]]
+        parts += [f"[첨부 파일: {a['filename']} {a['url']}]" for a in record["attachments"]]
+        if record["edited_at"]:
+            parts.append("(수정됨)")
+        return f"[{timestamp}] {record['author']['name']}: {' '.join(parts)}"
+    
+    def render(self, records: List[dict]) -> str:
+        return "".join(self.line(record) + "\n" for record in records)
+
+class JsonLinesRenderer(TranscriptRenderer):
+    """메시지당 JSON 한 줄인 구조화된 트랜스크립트입니다."""
+    extension = "jsonl"
+    
+    def render(self, records: List[dict]) -> str:
+        return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+class HtmlRenderer(TranscriptRenderer):
+    """외부 파일 없이 열리는 HTML 트랜스크립트입니다. 템플릿은 한 번만 만들어 모든 티켓에서 재사용합니다."""
+    extension = "html"
     
-    def get_duration(self):
-        if not self.end_time:
-            return datetime.datetime.now() - self.start_time
-        return self.end_time - self.start_time
+    PAGE_HEAD = string.Template(
+        "<!DOCTYPE html>\n<html lang=\"ko\"><head><meta charset=\"utf-8\"><title>$title</title><style>"
+        "body{background:#313338;color:#dbdee1;font-family:sans-serif;margin:0;padding:16px}"
+        "h1{font-size:18px}.msg{display:flex;gap:12px;padding:6px 0}"
+        ".avatar{width:40px;height:40px;border-radius:50%;flex:none}"
+        ".name{font-weight:600;color:#f2f3f5}.time,.edited{color:#949ba4;font-size:12px;margin-left:6px}"
+        ".content{white-space:pre-wrap;word-break:break-word}"
+        ".reply{color:#949ba4;font-size:13px}.reply a{color:#00a8fc}"
+        ".embed{border-left:4px solid $embed_color;background:#2b2d31;border-radius:4px;padding:8px 12px;margin-top:4px;max-width:520px}"
+        ".embed-title{font-weight:600}.field{margin-top:4px}.field-name{font-weight:600;font-size:13px}"
+        ".attachment a{color:#00a8fc}"
+        "</style></head><body><h1>$title</h1>\n"
+    )
+    MESSAGE = string.Template(
+        "<div class=\"msg\" id=\"m$id\">$avatar<div>$reply"
+        "<div><span class=\"name\">$name</span><span class=\"time\">$time</span>$edited</div>"
+        "<div class=\"content\">$content</div>$embeds$attachments</div></div>\n"
+    )
+    EMBED = string.Template(
+        "<div class=\"embed\" style=\"border-color:$color\">"
+        "<div class=\"embed-title\">$title</div><div class=\"content\">$description</div>$fields</div>"
+    )
+    FIELD = string.Template("<div class=\"field\"><div class=\"field-name\">$name</div><div class=\"content\">$value</div></div>")
+    PAGE_FOOT = "</body></html>\n"
+    
+    def header(self, title: str) -> str:
+        return self.PAGE_HEAD.substitute(title=html.escape(title), embed_color="#4e5058")
+    
+    def embed(self, embed: dict) -> str:
+        color = embed.get("color")
+        return self.EMBED.substitute(
+            color=f"#{color:06x}" if color is not None else "#4e5058",
+            title=html.escape(embed.get("title", "")),
+            description=html.escape(embed.get("description", "")),
+            fields="".join(
+                self.FIELD.substitute(name=html.escape(field.get("name", "")), value=html.escape(field.get("value", "")))
+                for field in embed.get("fields", [])
+            )
+        )
+    
+    def message(self, record: dict) -> str:
+        author = record["author"]
+        created_at = datetime.datetime.fromisoformat(record["created_at"])
+        avatar = f"<img class=\"avatar\" src=\"{html.escape(author['avatar_url'])}\" alt=\"\">" if author["avatar_url"] else ""
+        reply = ""
+        if record["reply_to"]:
+            reply = f"<div class=\"reply\">↪ <a href=\"#m{record['reply_to']}\">답장한 메시지</a></div>"
+        edited = ""
+        if record["edited_at"]:
+            edited_at = datetime.datetime.fromisoformat(record["edited_at"])
+            edited = f"<span class=\"edited\">(수정됨 {edited_at:%Y-%m-%d %H:%M:%S})</span>"
+        attachments = "".join(
+            f"<div class=\"attachment\">📎 <a href=\"{html.escape(a['url'])}\">{html.escape(a['filename'])}</a></div>"
+            for a in record["attachments"]
+        )
+        return self.MESSAGE.substitute(
+            id=record["id"],
+            avatar=avatar,
+            reply=reply,
+            name=html.escape(author["display_name"]),
+            time=f"{created_at:%Y-%m-%d %H:%M:%S}",
+            edited=edited,
+            content=html.escape(record["content"]),
+            embeds="".join(self.embed(embed) for embed in record["embeds"]),
+            attachments=attachments
+        )
+    
+    def render(self, records: List[dict]) -> str:
+        return "".join(self.message(record) for record in records)
+    
+    def footer(self) -> str:
+        return self.PAGE_FOOT
+
+# 형식 이름 -> 렌더러 (모든 티켓이 같은 렌더러를 공유)
+TRANSCRIPT_RENDERERS = {
+    "text": TextRenderer(),
+    "jsonl": JsonLinesRenderer(),
+    "html": HtmlRenderer(),
+}
+
+# 트랜스크립트 기록기
+class TranscriptWriter:
+    """트랜스크립트를 페이지 단위로 디스크에 기록합니다. 렌더링과 파일 입출력은 이벤트 루프 밖에서 수행합니다."""
+    def __init__(self, path: str, compress: bool = TRANSCRIPT_GZIP, renderer: Optional[TranscriptRenderer] = None, title: str = ""):
+        self.path = path
+        self.compress = compress
+        self.renderer = renderer or TRANSCRIPT_RENDERERS["text"]
+        self.title = title
+        self.file = None
+        self.lines_written = 0
+    
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        if self.compress:
+            file = gzip.open(self.path, 'wt', encoding='utf-8')
+        else:
+            file = open(self.path, 'w', encoding='utf-8')
+        file.write(self.renderer.header(self.title))
+        return file
+    
+    def _write(self, records: List[dict]):
+        self.file.write(self.renderer.render(records))
+    
+    def _close(self):
+        try:
+            self.file.write(self.renderer.footer())
+        finally:
+            self.file.close()
+    
+    async def __aenter__(self):
+        self.file = await asyncio.to_thread(self._open)
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await asyncio.to_thread(self._close)
+    
+    async def write_records(self, records: List[dict]):
+        """메시지 묶음 하나를 렌더링해 파일에 덧붙입니다."""
+        if not records:
+            return
+        await asyncio.to_thread(self._write, records)
+        self.lines_written += len(records)
+
+class ArchiveWriter:
+    """트랜스크립트를 페이지 단위로 보관소에 색인합니다."""
+    def __init__(self, archive: TranscriptArchive, channel_id: int, metadata: dict):
+        self.archive = archive
+        self.channel_id = channel_id
+        self.metadata = metadata
+        self.lines_written = 0
+    
+    async def __aenter__(self):
+        await asyncio.to_thread(self.archive.begin, self.channel_id)
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await asyncio.to_thread(self.archive.finish, self.channel_id, self.metadata, self.lines_written)
+    
+    def _add(self, records: List[dict]):
+        renderer = TRANSCRIPT_RENDERERS["text"]
+        self.archive.add_chunk(self.channel_id, "\n".join(renderer.line(record) for record in records))
+    
+    async def write_records(self, records: List[dict]):
+        if not records:
+            return
+        await asyncio.to_thread(self._add, records)
+        self.lines_written += len(records)
+
+async def export_transcript(channel: discord.TextChannel, archive: Optional[TranscriptArchive] = None,
+                            metadata: Optional[dict] = None, compress: bool = TRANSCRIPT_GZIP) -> List[str]:
+    """채널 기록을 페이지 단위로 읽으며 설정된 형식으로 스트리밍합니다. 만든 파일 경로 목록을 반환합니다."""
+    paths = []
+    async with contextlib.AsyncExitStack() as stack:
+        writers = []
+        for name, renderer in TRANSCRIPT_RENDERERS.items():
+            if name not in TRANSCRIPT_FORMATS:
+                continue
+            # 같은 이름의 티켓이 덮어쓰지 않도록 채널 ID를 붙임
+            extension = f"{renderer.extension}.gz" if compress else renderer.extension
+            path = os.path.join(TRANSCRIPT_DIR, f"ticket-{channel.name}-{channel.id}.{extension}")
+            writers.append(await stack.enter_async_context(TranscriptWriter(path, compress, renderer, f"#{channel.name}")))
+            paths.append(path)
+        if "archive" in TRANSCRIPT_FORMATS and archive is not None and metadata is not None:
+            writers.append(await stack.enter_async_context(ArchiveWriter(archive, channel.id, metadata)))
+        
+        # 기록 조회와 렌더링/파일 기록에 걸린 시간을 나눠서 측정
+        fetch_time = write_time = 0.0
+        page = []
+        mark = time.perf_counter()
+        async for message in channel.history(limit=None, oldest_first=True):
+            page.append(message_to_record(message))
+            if len(page) >= TRANSCRIPT_PAGE_SIZE:
+                now = time.perf_counter()
+                fetch_time += now - mark
+                # 형식별 렌더링은 서로 다른 스레드에서 동시에 진행
+                await asyncio.gather(*(writer.write_records(page) for writer in writers))
+                mark = time.perf_counter()
+                write_time += mark - now
+                page = []
+        now = time.perf_counter()
+        fetch_time += now - mark
+        await asyncio.gather(*(writer.write_records(page) for writer in writers))
+        write_time += time.perf_counter() - now
+    metrics.observe("phase_seconds", fetch_time, phase="history_fetch")
+    metrics.observe("phase_seconds", write_time, phase="file_write")
+    return paths
 
 # 티켓 패널 뷰
 class TicketPanelView(discord.ui.View):
@@ -379,8 +3755,11 @@ class TicketPanelView(discord.ui.View):
                 
             button = TicketButton(ticket_type, i)
             self.add_item(button)
+        
+        # 클릭은 TicketDispatcher가 처리하므로 메시지마다 뷰를 저장하지 않음
+        self.stop()
 
-# 티켓 버튼 클래스
+# 티켓 버튼 클래스 (클릭은 TicketDispatcher가 처리)
 class TicketButton(discord.ui.Button):
     def __init__(self, ticket_type: str, position: int):
         # 버튼 스타일 결정 (순서에 따라 다른 색상)
@@ -399,183 +3778,264 @@ class TicketButton(discord.ui.Button):
         )
         
         self.ticket_type = ticket_type
-    
-    async def callback(self, interaction: discord.Interaction):
-        bot = interaction.client
-        guild_id = str(interaction.guild_id)
+
+# 티켓 관리 뷰 (클릭은 TicketDispatcher가 처리)
+class TicketManageView(discord.ui.View):
+    def __init__(self):
+        super().__init__(timeout=None)
+        self.add_item(discord.ui.Button(label="티켓 닫기", style=discord.ButtonStyle.danger, emoji="🔒", custom_id="close_ticket"))
+        self.add_item(discord.ui.Button(label="참여자 추가", style=discord.ButtonStyle.success, emoji="👥", custom_id="add_participant"))
+        self.add_item(discord.ui.Button(label="우선순위 설정", style=discord.ButtonStyle.primary, emoji="🔄", custom_id="set_priority"))
         
-        # 설정 확인
-        if guild_id not in bot.ticket_settings:
-            await interaction.response.send_message("티켓 시스템이 설정되지 않았습니다.", ephemeral=True)
+        # 메시지마다 뷰를 저장하지 않음
+        self.stop()
+
+# 티켓 버튼 디스패처
+class TicketDispatcher:
+    """티켓 버튼 클릭을 custom_id로 처리합니다. 티켓은 상호작용이 일어난 채널로 찾습니다."""
+    def __init__(self, bot: TicketBot):
+        self.bot = bot
+        self.handlers = {
+            "close_ticket": self.close_ticket,
+            "add_participant": self.add_participant,
+            "set_priority": self.set_priority,
+        }
+    
+    async def dispatch(self, interaction: discord.Interaction):
+        """on_interaction 이벤트에서 티켓 버튼 클릭을 찾아 처리합니다."""
+        if interaction.type != discord.InteractionType.component or not interaction.guild:
             return
+        custom_id = (interaction.data or {}).get("custom_id", "")
+        try:
+            # 아직 읽지 않은 서버 설정은 처리기에서 동기로 읽지 않도록 이벤트 루프 밖에서 먼저 읽음
+            await self.bot.ticket_settings.preload([str(interaction.guild_id)])
+            if custom_id.startswith("ticket_"):
+                with metrics.time("handler_seconds", handler="create_ticket"):
+                    await self.create_ticket(interaction, custom_id[len("ticket_"):])
+            elif custom_id in self.handlers:
+                with metrics.time("handler_seconds", handler=custom_id):
+                    await self.handlers[custom_id](interaction)
+        except Exception as e:
+            metrics.inc("handler_errors_total", handler="create_ticket" if custom_id.startswith("ticket_") else custom_id)
+            print(f"버튼 처리 중 오류 ({custom_id}): {e}")
+    
+    def is_ticket(self, channel) -> bool:
+        return channel is not None and (channel.id in self.bot.active_tickets or self.bot.ticket_index.get(channel.id) is not None)
+    
+    async def reject_non_ticket(self, interaction: discord.Interaction) -> bool:
+        """티켓 채널이 아니면 안내하고 True를 반환합니다."""
+        if self.is_ticket(interaction.channel):
+            return False
+        await interaction.response.send_message("티켓 채널에서만 사용할 수 있습니다.", ephemeral=True)
+        return True
+    
+    async def create_ticket(self, interaction: discord.Interaction, ticket_type: str):
+        bot = self.bot
+        guild_id = str(interaction.guild_id)
+        # 이 처리기(와 여기서 시작한 작업)의 REST 요청은 백그라운드 작업보다 먼저 보냄
+        rest_priority.set("create")
         
-        settings = bot.ticket_settings[guild_id]
+        # 3초 응답 제한을 넘기지 않도록 즉시 응답 보류
+        await interaction.response.defer(ephemeral=True)
         
-        # 카테고리 확인
-        category = interaction.guild.get_channel(settings.get("category_id"))
-        if not category:
-            await interaction.response.send_message("티켓 카테고리를 찾을 수 없습니다.", ephemeral=True)
+        # 설정 확인
+        config = bot.guild_config(interaction.guild)
+        if config is None:
+            await interaction.followup.send("티켓 시스템이 설정되지 않았습니다.", ephemeral=True)
             return
         
         # 사용자 티켓 수 확인
-        user_tickets = sum(1 for channel in category.channels 
-                          if channel.name.startswith("ticket-") and channel.name.endswith(str(interaction.user.name)))
-        
-        max_tickets = settings.get("max_tickets_per_user", 3)
+        with metrics.time("phase_seconds", phase="index_lookup"):
+            user_tickets = bot.ticket_index.user_count(interaction.guild_id, interaction.user.id)
         
-        if user_tickets >= max_tickets:
-            await interaction.response.send_message(
+        if user_tickets >= config.max_tickets:
+            await interaction.followup.send(
                 "최대 티켓 수에 도달했습니다. 기존 티켓을 닫고 새로 만들어주세요.",
                 ephemeral=True
             )
             return
         
-        # 티켓 채널 생성 권한 설정
-        overwrites = {
-            interaction.guild.default_role: discord.PermissionOverwrite(read_messages=False),
-            interaction.user: discord.PermissionOverwrite(read_messages=True, send_messages=True)
-        }
-        
-        # 지원팀 역할 권한 추가
-        for role_id in settings.get("support_role_ids", []):
-            role = interaction.guild.get_role(role_id)
-            if role:
-                overwrites[role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-        
-        # 티켓 채널 생성
-        ticket_channel = await category.create_text_channel(
-            f"ticket-{self.ticket_type}-{interaction.user.name}",
-            overwrites=overwrites
-        )
-        
-        # 티켓 타이머 시작
-        bot.active_tickets[ticket_channel.id] = TicketTimer()
-        
-        # 임베드 설정
-        embed_settings = settings.get("ticket_created_embed", {
-            "title": "🎫 새로운 티켓",
-            "description": "티켓이 생성되었습니다.\n담당자가 곧 응답할 것입니다.",
-            "color": 0x3498db
-        })
-        
-        embed = discord.Embed(
-            title=embed_settings.get("title", "🎫 새로운 티켓"),
-            description=embed_settings.get("description", "티켓이 생성되었습니다.\n담당자가 곧 응답할 것입니다."),
-            color=embed_settings.get("color", 0x3498db)
-        )
-        
-        if embed_settings.get("footer"):
-            embed.set_footer(text=embed_settings.get("footer"))
-        
-        # 티켓 관리 뷰 생성
-        manage_view = TicketManageView(bot, ticket_channel)
-        
-        # 티켓 채널에 메시지 전송
-        support_mentions = ", ".join(f"<@&{role_id}>" for role_id in settings.get("support_role_ids", []))
-        
-        await ticket_channel.send(
-            content=f"{interaction.user.mention} {support_mentions}",
-            embed=embed,
-            view=manage_view
-        )
+        # 같은 사용자가 같은 종류를 동시에 누르면 진행 중인 생성 결과를 함께 받음 (다른 종류는 따로 생성)
+        with metrics.time("phase_seconds", phase="channel_create"):
+            ticket_channel, shared = await bot.ticket_creation.run(
+                (interaction.guild_id, interaction.user.id, ticket_type),
+                lambda: self.open_channel(interaction, config, ticket_type)
+            )
+        if ticket_channel is False:
+            await interaction.followup.send("티켓을 만들 카테고리나 지원 채널을 찾을 수 없거나 가득 찼습니다. 관리자에게 문의해주세요.", ephemeral=True)
+            return
+        if not ticket_channel:
+            await interaction.followup.send("티켓 채널을 생성하지 못했습니다. 잠시 후 다시 시도해주세요.", ephemeral=True)
+            return
         
         # 사용자에게 응답
-        await interaction.response.send_message(
+        await interaction.followup.send(
             f"티켓이 생성되었습니다: {ticket_channel.mention}",
             ephemeral=True
         )
+        if shared:
+            return
         
-        # 로그 채널에 기록
-        log_channel_id = settings.get("log_channel_id")
-        if log_channel_id:
-            log_channel = interaction.guild.get_channel(log_channel_id)
-            if log_channel:
+        # 나머지 작업은 백그라운드에서 동시에 처리
+        user = interaction.user
+        guild = interaction.guild
+        
+        async def save_record():
+            # 그 사이에 티켓이 닫혔다면 닫을 때 이미 저장됨
+            record = bot.active_tickets.get(ticket_channel.id)
+            if record:
+                await bot.save_tickets(record)
+        
+        async def send_welcome():
+            # 티켓 관리 뷰 생성
+            manage_view = TicketManageView()
+            
+            # 티켓 채널에 메시지 전송
+            with metrics.time("phase_seconds", phase="send"):
+                await ticket_channel.send(
+                    content=f"{user.mention} {config.support_mentions}",
+                    embed=config.created_embed,
+                    view=manage_view
+                )
+        
+        async def send_log():
+            # 로그 채널에 기록
+            if config.log_channel_id:
                 log_embed = discord.Embed(
                     title="🎫 새 티켓 생성됨",
-                    description=f"**채널:** {ticket_channel.mention}\n**생성자:** {interaction.user.mention}\n**종류:** {self.ticket_type}",
+                    description=f"**채널:** {ticket_channel.mention}\n**생성자:** {user.mention}\n**종류:** {ticket_type}",
                     color=discord.Color.green(),
                     timestamp=datetime.datetime.now()
                 )
-                await log_channel.send(embed=log_embed)
-
-# 티켓 관리 뷰
-class TicketManageView(discord.ui.View):
-    def __init__(self, bot: TicketBot, ticket_channel):
-        super().__init__(timeout=None)
-        self.bot = bot
-        self.ticket_channel = ticket_channel
-    
-    @discord.ui.button(label="티켓 닫기", style=discord.ButtonStyle.danger, emoji="🔒", custom_id="close_ticket")
-    async def close_ticket(self, interaction: discord.Interaction, button: discord.ui.Button):
-        guild_id = str(interaction.guild_id)
-        settings = self.bot.ticket_settings.get(guild_id)
+                with metrics.time("phase_seconds", phase="send"):
+                    await bot.send_log(guild, log_embed)
         
-        if not settings:
-            await interaction.response.send_message("티켓 시스템이 설정되지 않았습니다.", ephemeral=True)
-            return
+        bot.run_pipeline(f"티켓 생성 {ticket_channel.id}", save_record, send_welcome, send_log)
+    
+    async def open_channel(self, interaction: discord.Interaction, config: GuildConfig,
+                           ticket_type: str):
+        """티켓 채널을 만들고 인덱스와 기록에 등록합니다. 실패하면 None, 넣을 카테고리가 없으면 False를 반환합니다."""
+        bot = self.bot
         
-        # 타이머 종료
-        timer = self.bot.active_tickets.get(self.ticket_channel.id)
-        if timer:
-            timer.close()
-            duration = timer.get_duration()
+        channel_name = f"ticket-{ticket_type}-{interaction.user.name}"
+        if config.ticket_mode == "thread" and config.thread_channel_id:
+            ticket_channel = await self.open_thread(interaction, config, channel_name)
+            if not ticket_channel:
+                return ticket_channel
         else:
-            duration = None
+            ticket_channel = await self.open_text_channel(interaction, config, channel_name, ticket_type)
+            if not ticket_channel:
+                return ticket_channel
         
-        # 메시지 기록 저장
-        messages = []
-        async for message in self.ticket_channel.history(limit=None, oldest_first=True):
-            timestamp = message.created_at.strftime("%Y-%m-%d %H:%M:%S")
-            content = message.content if message.content else "[임베드 또는 첨부 파일]"
-            messages.append(f"[{timestamp}] {message.author.name}: {content}")
+        # 생성 이벤트를 기다리지 않고 바로 인덱스에 반영
+        bot.ticket_index.add(interaction.guild_id, ticket_channel.id, interaction.user.id, ticket_type)
         
-        # 트랜스크립트 저장
-        os.makedirs('transcripts', exist_ok=True)
-        transcript_path = f'transcripts/ticket-{self.ticket_channel.name}.txt'
+        # 티켓 기록 생성 (처리 시간 측정 시작)
+        bot.open_record(TicketRecord(ticket_channel.id, interaction.guild_id, interaction.user.id, ticket_type))
+        return ticket_channel
+    
+    async def open_thread(self, interaction: discord.Interaction, config: GuildConfig, name: str):
+        """지원 채널 아래에 비공개 스레드를 만들고 개설자를 추가합니다. 지원팀은 환영 메시지의 역할 멘션으로 추가됩니다."""
+        parent = interaction.guild.get_channel(config.thread_channel_id)
+        if parent is None:
+            return False
+        try:
+            thread = await parent.create_thread(
+                name=name,
+                type=discord.ChannelType.private_thread,
+                invitable=False,
+                auto_archive_duration=THREAD_AUTO_ARCHIVE
+            )
+            await thread.add_user(interaction.user)
+        except discord.HTTPException as e:
+            print(f"티켓 스레드 생성 중 오류: {e}")
+            return None
+        return thread
+    
+    async def open_text_channel(self, interaction: discord.Interaction, config: GuildConfig, channel_name: str,
+                                ticket_type: str):
+        bot = self.bot
         
-        with open(transcript_path, 'w', encoding='utf-8') as f:
-            f.write("\n".join(messages))
+        # 티켓 채널 생성 권한 설정 (지원팀 역할 권한은 미리 해석됨)
+        overwrites = config.ticket_overwrites(interaction.user)
         
-        # 로그 채널에 기록
-        log_channel_id = settings.get("log_channel_id")
-        if log_channel_id:
-            log_channel = interaction.guild.get_channel(log_channel_id)
-            if log_channel:
-                close_embed = discord.Embed(
-                    title="🔒 티켓 닫힘",
-                    description=f"**티켓:** {self.ticket_channel.name}\n**닫은 사람:** {interaction.user.mention}",
-                    color=discord.Color.red(),
-                    timestamp=datetime.datetime.now()
-                )
-                
-                if duration:
-                    close_embed.add_field(
-                        name="처리 시간",
-                        value=str(duration).split('.')[0]
+        # 티켓 채널 생성 (대기 채널이 있으면 꺼내서 사용)
+        topic = build_ticket_topic(interaction.user.id, ticket_type)
+        ticket_channel = bot.channel_pool.claim(interaction.guild)
+        try:
+            if ticket_channel:
+                try:
+                    await ticket_channel.edit(name=channel_name, overwrites=overwrites, topic=topic)
+                    # 채널당 10분에 2회인 이름 변경 한도를 여기서도 하나 씀
+                    bot.rename_coalescer.record(ticket_channel.id)
+                except discord.NotFound:
+                    ticket_channel = None
+                except discord.HTTPException as e:
+                    print(f"대기 채널 사용 중 오류: {e}")
+                    # 바뀌지 않은 대기 채널은 카테고리에 남지 않도록 풀로 돌려놓음
+                    bot.channel_pool.release(interaction.guild.id, ticket_channel.id)
+                    ticket_channel = None
+            if not ticket_channel:
+                # 가장 여유 있는 티켓 카테고리에 생성
+                category = await bot.ticket_category(interaction.guild)
+                if category is None:
+                    return False
+                try:
+                    ticket_channel = await category.create_text_channel(
+                        channel_name,
+                        overwrites=overwrites,
+                        topic=topic
                     )
-                
-                await log_channel.send(
-                    embed=close_embed,
-                    file=discord.File(transcript_path, filename=f'transcript-{self.ticket_channel.name}.txt')
-                )
+                finally:
+                    bot.category_tracker.settle(category.id, ticket_channel)
+        except discord.HTTPException as e:
+            print(f"티켓 채널 생성 중 오류: {e}")
+            return None
+        return ticket_channel
+    
+    async def close_ticket(self, interaction: discord.Interaction):
+        if await self.reject_non_ticket(interaction):
+            return
+        
+        ticket_channel = interaction.channel
+        if str(interaction.guild_id) not in self.bot.ticket_settings:
+            await interaction.response.send_message("티켓 시스템이 설정되지 않았습니다.", ephemeral=True)
+            return
+        
+        # 트랜스크립트 저장이 오래 걸려도 3초 응답 제한을 넘기지 않도록 먼저 알림
+        await interaction.response.send_message(
+            f"티켓을 닫는 중입니다. 대화 기록을 저장한 뒤 {CLOSE_DELETE_DELAY}초 후 삭제됩니다.", ephemeral=True
+        )
         
-        # 티켓 삭제 알림
-        await interaction.response.send_message("티켓이 닫히고 5초 후 삭제됩니다.", ephemeral=True)
+        bot = self.bot
+        closed_by = interaction.user
+        
+        async def finish_and_delete():
+            # 기록 닫기, 트랜스크립트 저장, 로그
+            try:
+                await bot.finish_ticket(ticket_channel, closed_by.id)
+            except Exception as e:
+                print(f"티켓 닫기 중 오류 발생: {e}")
+            # 닫기가 실패해도 티켓 채널 삭제는 예약 (재시작되어도 삭제됨)
+            await bot.scheduler.schedule(
+                CLOSE_DELETE_DELAY, "delete_channel", ticket_channel.guild.id, ticket_channel.id,
+                {"reason": f"티켓 닫힘: {closed_by}"}
+            )
         
-        # 5초 후 티켓 채널 삭제
-        await asyncio.sleep(5)
-        await self.ticket_channel.delete()
+        bot.run_pipeline("close_ticket", finish_and_delete)
     
-    @discord.ui.button(label="참여자 추가", style=discord.ButtonStyle.success, emoji="👥", custom_id="add_participant")
-    async def add_participant(self, interaction: discord.Interaction, button: discord.ui.Button):
-        modal = AddParticipantModal(self.ticket_channel)
+    async def add_participant(self, interaction: discord.Interaction):
+        if await self.reject_non_ticket(interaction):
+            return
+        modal = AddParticipantModal(interaction.channel)
         await interaction.response.send_modal(modal)
     
-    @discord.ui.button(label="우선순위 설정", style=discord.ButtonStyle.primary, emoji="🔄", custom_id="set_priority")
-    async def set_priority(self, interaction: discord.Interaction, button: discord.ui.Button):
+    async def set_priority(self, interaction: discord.Interaction):
+        if await self.reject_non_ticket(interaction):
+            return
         await interaction.response.send_message(
             "티켓 우선순위를 선택하세요:",
-            view=TicketPriorityView(self.ticket_channel),
+            view=TicketPriorityView(interaction.channel),
             ephemeral=True
         )
 
@@ -602,20 +4062,65 @@ class TicketPriorityView(discord.ui.View):
         await self.set_priority(interaction, "LOW")
     
     async def set_priority(self, interaction: discord.Interaction, priority: str):
+        with metrics.time("handler_seconds", handler="priority_select"):
+            await self.apply_priority(interaction, priority)
+    
+    async def apply_priority(self, interaction: discord.Interaction, priority: str):
+        # 티켓 기록에 우선순위 저장
+        record = interaction.client.active_tickets.get(self.ticket_channel.id)
+        if record:
+            record.priority = priority
+        
+        # 응답 (채널 이름은 속도 제한에 맞춰 나중에 반영)
+        await interaction.response.send_message(f"티켓 우선순위가 {priority}로 설정되었습니다.", ephemeral=True)
+        
+        if record:
+            await interaction.client.save_tickets(record)
+        
         # 채널 이름에서 우선순위 부분 제거
         channel_name = self.ticket_channel.name
         if any(p in channel_name for p in ["URGENT", "HIGH", "MEDIUM", "LOW"]):
             parts = channel_name.split("-")
             channel_name = "-".join([p for p in parts if p not in ["URGENT", "HIGH", "MEDIUM", "LOW"]])
         
-        # 새 우선순위로 채널 이름 변경
+        # 새 우선순위로 채널 이름 변경 예약
         new_name = f"{channel_name}-{priority}"
-        await self.ticket_channel.edit(name=new_name)
-        
-        # 응답
-        await interaction.response.send_message(f"티켓 우선순위가 {priority}로 설정되었습니다.", ephemeral=True)
+        interaction.client.rename_coalescer.request(self.ticket_channel.id, new_name)
         
+def launch_shard_groups(shard_count: int, processes: int):
+    """샤드를 여러 그룹으로 나눠 그룹마다 별도 프로세스로 봇을 실행합니다."""
+    children = []
+    for index in range(processes):
+        shard_ids = list(range(index, shard_count, processes))
+        if not shard_ids:
+            break
+        env = dict(os.environ,
+                   TICKET_SHARD_COUNT=str(shard_count),
+                   TICKET_SHARD_IDS=",".join(map(str, shard_ids)),
+                   TICKET_PROCESS_INDEX=str(index),
+                   TICKET_PROCESS_COUNT=str(min(processes, shard_count)))
+        children.append(subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env))
+        print(f"프로세스 {index}: 샤드 {shard_ids}")
+    try:
+        for child in children:
+            child.wait()
+    except KeyboardInterrupt:
+        for child in children:
+            child.terminate()
+        for child in children:
+            child.wait()
+
 def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="티켓 봇")
+    parser.add_argument("--shard-count", type=int, help="전체 샤드 수")
+    parser.add_argument("--processes", type=int, default=1, help="샤드 그룹(프로세스) 수")
+    args = parser.parse_args()
+    if args.shard_count and args.processes > 1:
+        launch_shard_groups(args.shard_count, args.processes)
+        return
+    if args.shard_count:
+        bot.shard_count = args.shard_count
     # 봇 실행
     bot.run("")  
 
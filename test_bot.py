@@ -0,0 +1,195 @@
+"""실제 TicketBot으로 py-cord 이벤트 경로가 연결되어 있는지 확인합니다.
+
+    python -m pytest -q
+"""
+import asyncio
+
+import discord
+
+import main
+
+
+class FakeInteraction:
+    def __init__(self, custom_id: str):
+        self.type = discord.InteractionType.component
+        self.guild = object()
+        self.guild_id = 1
+        self.data = {"custom_id": custom_id}
+
+
+async def settle():
+    # 이벤트 처리기는 별도 작업으로 실행되므로 몇 번 양보해 끝나기를 기다림
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def make_bot() -> main.TicketBot:
+    return main.TicketBot(command_prefix="!", intents=discord.Intents.default())
+
+
+def test_component_interaction_reaches_dispatcher(monkeypatch):
+    calls = []
+
+    async def create_ticket(self, interaction, ticket_type):
+        calls.append(ticket_type)
+
+    monkeypatch.setattr(main.TicketDispatcher, "create_ticket", create_ticket)
+
+    async def scenario():
+        bot = make_bot()
+        bot.dispatch("interaction", FakeInteraction("ticket_구매문의"))
+        await settle()
+        return bot
+
+    bot = asyncio.run(scenario())
+    assert calls == ["구매문의"]
+    assert isinstance(bot.dispatcher, main.TicketDispatcher)
+
+
+def test_login_runs_startup_once(monkeypatch):
+    started = []
+
+    async def login(self, token):
+        pass
+
+    async def startup(self):
+        started.append(self)
+
+    monkeypatch.setattr(discord.Client, "login", login)
+    monkeypatch.setattr(main.TicketBot, "startup", startup)
+
+    async def scenario():
+        bot = make_bot()
+        await bot.login("token")
+        await bot.login("token")
+        return bot
+
+    bot = asyncio.run(scenario())
+    assert started == [bot]
+
+
+def test_add_participant_modal_builds():
+    async def scenario():
+        return main.AddParticipantModal(None)
+
+    modal = asyncio.run(scenario())
+    assert modal.user_id.style == discord.InputTextStyle.paragraph
+
+
+def test_bulk_close_retries_until_guild_removed():
+    async def scenario():
+        bot = make_bot()
+        closer = bot.bulk_closer
+        waiting = await closer.close_one(10, 1, None, "테스트", "pending")
+        await bot.on_guild_remove(discord.Object(id=1))
+        dropped = await closer.close_one(10, 1, None, "테스트", "pending")
+        return waiting, dropped
+
+    waiting, dropped = asyncio.run(scenario())
+    assert waiting is None
+    assert dropped is False
+
+
+def test_failed_scheduled_action_is_retried(monkeypatch):
+    monkeypatch.setattr(main.TicketBot, "get_guild", lambda self, guild_id: object())
+
+    async def scenario():
+        bot = make_bot()
+        scheduler = bot.scheduler
+
+        async def failing(batch):
+            raise RuntimeError("실패")
+
+        scheduler.register("fail", failing)
+        action = main.ScheduledAction(None, 0, "fail", guild_id=1)
+        await scheduler.run_due([action])
+        retried = [entry[2] for entry in scheduler.heap]
+        await scheduler.purge_guild(1)
+        return action, retried, scheduler.heap
+
+    action, retried, remaining = asyncio.run(scenario())
+    assert retried == [action]
+    assert action.attempts == 1
+    assert remaining == []
+
+
+class FakeResponse:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, content=None, **kwargs):
+        self.messages.append(content)
+
+
+class FakeSetupInteraction:
+    guild_id = 1
+    guild = None
+
+    def __init__(self):
+        self.response = FakeResponse()
+
+
+def fill_setup_modal(modal, category, roles="5", types="구매문의"):
+    modal.category.value = category
+    modal.support_roles.value = roles
+    modal.ticket_types.value = types
+    modal.log_channel.value = "7"
+    modal.max_tickets.value = ""
+
+
+def test_setup_modal_keeps_other_settings(monkeypatch):
+    monkeypatch.setattr(main.TicketBot, "save_settings", lambda self, guild_id: None)
+    monkeypatch.setattr(main.TicketBot, "index_guild", lambda self, guild: None)
+
+    async def scenario():
+        bot = make_bot()
+        bot.ticket_settings["1"] = {
+            "category_id": 2, "category_ids": [2, 3], "overflow_category_ids": [3],
+            "ticket_mode": "thread", "log_mode": "digest", "idle_close_hours": 24,
+        }
+        modal = main.TicketSetupModal(bot)
+        fill_setup_modal(modal, "4")
+        interaction = FakeSetupInteraction()
+        await modal.callback(interaction)
+        return bot.ticket_settings["1"]
+
+    settings = asyncio.run(scenario())
+    assert settings["category_ids"] == [4, 3]
+    assert settings["overflow_category_ids"] == [3]
+    assert settings["ticket_mode"] == "thread"
+    assert settings["log_mode"] == "digest"
+    assert settings["idle_close_hours"] == 24
+    assert settings["support_role_ids"] == [5]
+
+
+def test_setup_modal_rejects_empty_input():
+    async def scenario():
+        bot = make_bot()
+        modal = main.TicketSetupModal(bot)
+        fill_setup_modal(modal, " , ")
+        interaction = FakeSetupInteraction()
+        await modal.callback(interaction)
+        return bot, interaction
+
+    bot, interaction = asyncio.run(scenario())
+    assert "1" not in bot.ticket_settings
+    assert len(interaction.response.messages) == 1
+
+
+def test_connect_syncs_commands_once(monkeypatch):
+    synced = []
+
+    async def sync_commands_if_changed(self):
+        synced.append(self)
+
+    monkeypatch.setattr(main.TicketBot, "sync_commands_if_changed", sync_commands_if_changed)
+
+    async def scenario():
+        bot = make_bot()
+        await bot.on_connect()
+        await bot.on_connect()
+        return bot
+
+    bot = asyncio.run(scenario())
+    assert bot.auto_sync_commands is False
+    assert synced == [bot]